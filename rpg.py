@@ -1,18 +1,25 @@
 #!/usr/bin/python3
 # PYTHON_ARGCOMPLETE_OK
 
-from PyQt5 import QtCore
-from PyQt5.QtWidgets import QApplication
 from rpg import Base
-from rpg.gui.wizard import Wizard
 import logging
 import sys
 
 
 def main():
     base = Base()
-    app = QApplication(sys.argv)
     base.conf.parse_cmdline()
+    if base.conf.headless:
+        # PyQt5 is not even imported in headless mode
+        from rpg.headless import main as headless_main
+        sys.exit(headless_main(base))
+    if base.conf.batch:
+        from rpg.batch import main as batch_main
+        sys.exit(batch_main(base))
+    from PyQt5 import QtCore
+    from PyQt5.QtWidgets import QApplication
+    from rpg.gui.wizard import Wizard
+    app = QApplication(sys.argv)
     if base.conf.load_dnf:
         base.sack = base.load_dnf_sack()
     base.load_plugins()
@@ -25,7 +32,9 @@ def main():
     wiz.show()
 
     logging.info('GUI loaded')
-    sys.exit(app.exec_())
+    ret = app.exec_()
+    base.write_profile_report()
+    sys.exit(ret)
 
 if __name__ == '__main__':
     main()
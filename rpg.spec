@@ -32,10 +32,8 @@ Recommends:     rpg-plugin-bash-command = %{version}-%{release}
 Summary:    C plugin for RPG
 
 BuildRequires:  coreutils
-BuildRequires:  makedepend
 
 Requires:       python3 >= 3.4
-Requires:       makedepend
 Requires:       coreutils
 Requires:       python3-rpg = %{version}-%{release}
 
@@ -136,13 +134,11 @@ BuildRequires:  coreutils
 BuildRequires:  rpmdevtools
 BuildRequires:  python3-copr >= 1.58
 BuildRequires:  mock
-BuildRequires:  file
 
 Requires:       rpmdevtools
 Requires:       python3 >= 3.4
 Requires:       mock
 Requires:       coreutils
-Requires:       file
 Recommends:     python3-dnf
 Recommends:     python3-copr >= 1.58
 Recommends:     python3-argcomplete
@@ -4,16 +4,22 @@ from rpg.plugin_engine import PluginEngine
 from rpg.plugins.misc.files_to_pkgs import FilesToPkgsPlugin
 from rpg.project_builder import ProjectBuilder
 from copr.client import CoprClient
-from rpg.package_builder import PackageBuilder, BuildException
+from rpg.package_builder import (PackageBuilder, BuildException,
+                                 BuildResult)
 from rpg.spec import Spec
 from rpg.command import Command
 from rpg.conf import Conf
-from rpg.utils import path_to_str
+from rpg.utils import path_to_str, get_cache_dir
+from rpg.checksum import SourceHasher
+from rpg.sack_index import CachedSack, SackIndex, repo_checksum
+from rpg.workspace import Workspace, clone_tree
 from os.path import isdir, isfile
-from os import makedirs, geteuid
-import shutil
-from shutil import rmtree
-from tempfile import gettempdir, mkdtemp
+from os import makedirs, geteuid, getpid
+from subprocess import CalledProcessError
+from tempfile import gettempdir
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+import json
 
 
 class Base(object):
@@ -53,16 +59,51 @@ class Base(object):
         self.spec = Spec()
         self.sack = None
         self._package_builder = PackageBuilder()
+        #: appended to workspace directory, so projects of one batch with
+        #: the same sources don't share it
+        self.workspace_suffix = ""
 
     def load_dnf_sack(self):
+        """ Returns sack whose names, provides, licenses and file lists are
+            loaded from cache. DNF sack is filled only when metadata of some
+            repository changed or when a plugin queries it. """
         logging.info('DNF sack is loading')
         import dnf
-        with dnf.Base() as self._dnf_base:
-            self._dnf_base.conf.releasever = dnf.rpm.detect_releasever(
-                self._dnf_base.conf.installroot)
-            self._dnf_base.read_all_repos()
-            self._dnf_base.fill_sack()
-            return self._dnf_base.sack
+        self._dnf_base = dnf.Base()
+        self._dnf_base.conf.releasever = dnf.rpm.detect_releasever(
+            self._dnf_base.conf.installroot)
+        self._dnf_base.read_all_repos()
+        index = SackIndex(get_cache_dir() / "sack.sqlite")
+        checksums = self._repo_checksums()
+        if None not in checksums.values() and \
+                checksums == index.repo_checksums():
+            logging.info('DNF sack loaded from cache')
+            return CachedSack(index, self._fill_dnf_sack)
+        sack = self._fill_dnf_sack()
+        self._update_sack_index(index, sack)
+        return CachedSack(index, lambda: sack)
+
+    def _fill_dnf_sack(self):
+        logging.info('DNF sack is filling')
+        self._dnf_base.fill_sack()
+        return self._dnf_base.sack
+
+    def _repo_checksums(self):
+        return dict((repo.id, repo_checksum(repo))
+                    for repo in self._dnf_base.repos.iter_enabled())
+
+    def _update_sack_index(self, index, sack):
+        """ Stores packages of repositories with changed metadata """
+        cached = index.repo_checksums()
+        checksums = self._repo_checksums()
+        for repo in set(cached) - set(checksums):
+            index.remove_repo(repo)
+        for repo, checksum in checksums.items():
+            if checksum is None or cached.get(repo) != checksum:
+                logging.info("indexing packages of repository " + repo)
+                index.update_repo(
+                    repo, checksum,
+                    sack.query().available().filter(reponame=repo))
 
     def _setup_logging(self):
         if geteuid() == 0:
@@ -71,6 +112,7 @@ class Base(object):
             log_dir = "/var/tmp/rpg/"
         if not isdir(log_dir):
             makedirs(log_dir)
+        self._log_dir = Path(log_dir)
         logging.basicConfig(level=logging.DEBUG,
                             format='[%(asctime)s] {%(pathname)s:%(lineno)d} '
                                    '%(levelname)s - %(message)s',
@@ -89,6 +131,17 @@ class Base(object):
                 Path(directory),
                 self.conf.exclude)
 
+    def write_profile_report(self):
+        """ Writes timing and resource usage of plugin hooks to profile.json
+            in log directory and logs its summary """
+        try:
+            profiler = self._plugin_engine.profiler
+        except AttributeError:
+            return
+        profiler.write_report(self._log_dir / "profile.json")
+        logging.info("plugin hooks profile ('{}'):\n{}".format(
+            str(self._log_dir / "profile.json"), profiler.summary()))
+
     def create_archive(self):
         """ Creates archive (archvie_path) from Source folder """
         self.spec.Source = self.spec.Name + "-" + self.spec.Version + ".tar.gz"
@@ -104,7 +157,7 @@ class Base(object):
         """ Returns path where compiled, extracted, installed
             directories are """
         try:
-            return Path("/tmp/rpg-%s" % self._hash)
+            return Path("/tmp/rpg-%s%s" % (self._hash, self.workspace_suffix))
         except AttributeError:
             msg = "`load_project_from_url` method needs to be called first"
             raise RuntimeError(msg)
@@ -166,59 +219,107 @@ class Base(object):
 
     def load_project_from_url(self, path):
         """executed in background after dir/tarball/SRPM selection"""
-        if not isdir(str(path)) and not isfile(str(path)):
-            temp = Path(gettempdir()) / "rpg-download"
+        if isdir(str(path)) or isfile(str(path)):
+            self._load_project(Path(path))
+            return
+        # projects may be downloaded by several processes at once
+        temp = Path(gettempdir()) / "rpg-download-{}".format(getpid())
+        try:
             self._plugin_engine.execute_download(path, temp)
-            path = temp
-        self.source_path = path = Path(path)
+            self._load_project(temp)
+        finally:
+            if temp.exists():
+                temp.unlink()
+
+    def _load_project(self, path):
+        self.source_path = path
         self._hash = self._compute_checksum(path)
+        self._workspace = Workspace(self.base_dir)
+        self.spec.prep = Command("%autosetup")
+        if self.conf.resume and \
+                self._workspace.is_done("extracted", self._hash):
+            logging.info("reusing extracted sources in '{}'"
+                         .format(str(self.extracted_dir)))
+            return
         self._setup_workspace()
         if isdir(str(path)):
-            Command("cp -pr " + str(path) + " " + str(self.extracted_dir))\
-                .execute()
+            # files are never hardlinked, the workspace is reused by
+            # checksum and in place edits of the imported directory would
+            # change it too
+            self.extracted_dir.rmdir()
+            clone_tree(path, self.extracted_dir)
         else:
             self._plugin_engine.execute_extraction(path, self.extracted_dir)
-        direc = [str(f) for f in self.extracted_dir.iterdir()]
-        if len(direc) == 1 and isdir(direc[0]):
-            direc = direc[0]
-            temp = mkdtemp()
-            Command('mv ' + direc + '/* ' + temp +
-                    ' && rm -rf ' + direc +
-                    ' && mv ' + temp + '/* ' + str(self.extracted_dir))\
-                .execute()
-            rmtree(temp)
-        logging.debug(str(direc))
-        self.spec.prep = Command("%autosetup")
+        logging.debug(str(self.extracted_dir))
+        self._workspace.done("extracted", self._hash)
 
     def run_extracted_source_analysis(self):
         """executed in background after dir/tarball/SRPM selection"""
-        self._plugin_engine.execute_phase(PluginEngine.phases[0],
-                                          self.extracted_dir)
+        self._run_phase(PluginEngine.phases[0], self.extracted_dir)
 
     def run_patched_source_analysis(self):
         """executed in background after patches are applied"""
-        self._plugin_engine.execute_phase(PluginEngine.phases[1],
-                                          self.extracted_dir)
+        self._run_phase(PluginEngine.phases[1], self.extracted_dir)
 
     def run_compiled_source_analysis(self):
         """executed in background after patches are applied"""
-        self._plugin_engine.execute_phase(PluginEngine.phases[2],
-                                          self.compiled_dir)
+        self._run_phase(PluginEngine.phases[2], self.compiled_dir)
+
+    def _run_phase(self, phase, project_dir):
+        """ Executes plugin phase and saves resulting spec as checkpoint
+            into workspace. If the phase was already run with the same spec,
+            plugins and sack (e.g. before crash), spec is restored from
+            checkpoint instead. """
+        key = self._checkpoint_key()
+        if self.conf.resume:
+            state = self._workspace.checkpoint(phase, key)
+            if state is not None:
+                logging.info("resuming spec after phase {}".format(phase))
+                self.spec.load_dict(state)
+                return
+        self._plugin_engine.execute_phase(phase, project_dir)
+        try:
+            self._workspace.save_checkpoint(phase, key, self.spec.to_dict())
+        except TypeError as err:
+            logging.warning("checkpoint of phase {} not saved: {}"
+                            .format(phase, str(err)))
+
+    def _checkpoint_key(self):
+        """ Returns digest of everything result of phase depends on
+            besides project files """
+        if self.sack is None:
+            sack = None
+        elif isinstance(self.sack, CachedSack):
+            sack = self.sack.index.repo_checksums()
+        else:
+            sack = type(self.sack).__name__
+        return sha256(json.dumps({
+            "spec": self.spec.to_dict(),
+            "plugins": self._plugin_engine.plugin_versions(),
+            "exclude": sorted(self.conf.exclude),
+            "sack": sack,
+        }, sort_keys=True).encode()).hexdigest()
 
     def install_project(self):
         """executed in background after filled requires screen"""
+        if self.conf.resume and \
+                self._workspace.is_done("installed", str(self.spec.install)):
+            logging.info("reusing installed project in '{}'"
+                         .format(str(self.installed_dir)))
+            return
+        self._workspace.reset("installed")
         self._project_builder.install(self.compiled_dir,
                                       self.installed_dir,
                                       self.spec.install)
+        self._workspace.done("installed", str(self.spec.install))
 
     def run_installed_source_analysis(self):
         """executed in background after successful project build"""
-        self._plugin_engine.execute_phase(PluginEngine.phases[3],
-                                          self.installed_dir)
+        self._run_phase(PluginEngine.phases[3], self.installed_dir)
 
     def write_spec(self):
         """ Creates spec file or rewrites old one. """
-        with open(path_to_str(self.spec_path), 'w') as spec_file:
+        with open(str(self.spec_path), 'w') as spec_file:
             spec_file.write(str(self.spec))
 
     def build_srpm(self):
@@ -229,34 +330,75 @@ class Base(object):
         self._package_builder.build_srpm(
             self.spec_path, self.archive_path, self.base_dir)
 
-    def build_rpm(self, target_distro, target_arch):
+    def build_rpm(self, target_distro, target_arch, clean=False):
         """ Build rpm from srpm. If srpm does not exists,
-            it will be created. """
+            it will be created. If clean is True, chroot is scrubbed
+            before the build. """
         try:
             self.srpm_path
         except RuntimeError:
             self.build_srpm()
         self._package_builder.build_rpm(
-            str(self.srpm_path), target_distro, target_arch, self.base_dir)
+            str(self.srpm_path), target_distro, target_arch, self.base_dir,
+            clean=clean)
+
+    def build_rpms(self, targets, max_workers=None):
+        """ Builds rpms for list of (distro, arch) targets concurrently,
+            at most max_workers at once (all by default). Each target is
+            built in its own chroot and its rpms and logs are moved into
+            base_dir/<distro>-<arch>. Returns dict target -> BuildResult """
+        try:
+            srpm = str(self.srpm_path)
+        except RuntimeError:
+            self.build_srpm()
+            srpm = str(self.srpm_path)
 
-    def build_rpm_recover(self, distro, arch):
+        def build(target):
+            distro, arch = target
+            output_dir = self.base_dir / (distro + "-" + arch)
+            builder = PackageBuilder(
+                uniqueext="rpg{}".format(getpid()))
+            try:
+                builder.build_rpm(srpm, distro, arch, output_dir)
+            except BuildException as be:
+                logging.info("build for {}-{} finished with {} errors"
+                             .format(distro, arch, len(be.errors)))
+                return BuildResult(
+                    be.return_code, be.errors, output_dir,
+                    sorted(_p for _p in output_dir.glob("*.rpm")
+                           if not _p.name.endswith(".src.rpm")),
+                    builder.mock_logs)
+
+        targets = list(targets)
+        with ThreadPoolExecutor(
+                max_workers=max_workers or len(targets) or 1) as executor:
+            return dict(zip(targets, executor.map(build, targets)))
+
+    def build_rpm_recover(self, distro, arch, progress=None, warm=False):
         """ Repeatedly build rpm with mock and finds all build errors.
+            All errors found in one build are fixed before the next one.
+            progress is called with iteration number and set of newly
+            added BuildRequires after every build. If warm is True, errors
+            are fixed in chroot of the first build first - new
+            BuildRequires are installed into it and only failed stage is
+            run again - and the package is rebuilt in scrubbed chroot at
+            the end.
             May raise RuntimeError on failed recover. """
-
-        def build():
-            self.build_srpm()
-            self.build_rpm(distro, arch)
-
-        def analyse():
-            _files_to_pkgs.installed(self.base_dir, self.spec, self.sack)
-            self.write_spec()
-
-        _files_to_pkgs = FilesToPkgsPlugin()
-        analyse()
+        self._resolve_requires()
+        iteration = 0
+        if warm:
+            iteration = self._recover_in_chroot(distro, arch, progress)
         while True:
+            iteration += 1
+            build_requires = set(self.spec.BuildRequires)
             try:
-                build()
+                self.build_srpm()
+                # packages installed into warm chroot must not hide
+                # missing BuildRequires
+                self.build_rpm(distro, arch, clean=warm)
             except BuildException as be:
+                logging.info("build {} finished with {} errors"
+                             .format(iteration, len(be.errors)))
                 if not self._plugin_engine.execute_mock_recover(be.errors):
                     if be.return_code:
                         raise RuntimeError(
@@ -264,7 +406,57 @@ class Base(object):
                             .format(self._package_builder.mock_logs))
                     break
             Command("rm -rf {}".format(path_to_str(self.spec_path))).execute()
-            analyse()
+            self._resolve_requires()
+            self._recover_progress(iteration, build_requires, progress)
+
+    def _recover_in_chroot(self, distro, arch, progress):
+        """ Fixes errors in chroot that is kept after first build, returns
+            number of iterations """
+        iteration = 1
+        error = BuildException([], 0)
+        self.build_srpm()
+        try:
+            self._package_builder.build_rpm(
+                str(self.srpm_path), distro, arch, self.base_dir,
+                keep_chroot=True)
+        except BuildException as be:
+            error = be
+        while error.return_code:
+            stage = self._package_builder.last_stage
+            build_requires = set(self.spec.BuildRequires)
+            if not self._package_builder.can_build_stage(stage) or \
+                    not self._plugin_engine.execute_mock_recover(
+                        error.errors):
+                break
+            self._resolve_requires()
+            added = self._recover_progress(iteration, build_requires,
+                                           progress)
+            iteration += 1
+            logging.info("running %{} in chroot again".format(stage))
+            try:
+                if added:
+                    self._package_builder.install_packages(
+                        distro, arch, added)
+                self._package_builder.build_stage(
+                    self.spec_path.name, distro, arch, stage)
+            except CalledProcessError as err:
+                logging.warning("recover in chroot failed: " + str(err))
+                break
+            except BuildException as be:
+                error = be
+        return iteration
+
+    def _resolve_requires(self):
+        FilesToPkgsPlugin().installed(self.base_dir, self.spec, self.sack)
+        self.write_spec()
+
+    def _recover_progress(self, iteration, build_requires, progress):
+        added = self.spec.BuildRequires - build_requires
+        logging.info("recover iteration {} added BuildRequires: {}"
+                     .format(iteration, ", ".join(sorted(added))))
+        if progress:
+            progress(iteration, added)
+        return added
 
     def fetch_repos(self, dist, arch):
         """ Initialize mock - should be called before build_rpm_recover """
@@ -272,9 +464,16 @@ class Base(object):
 
     def build_project(self):
         """ Executed in background after filled requires screen """
+        if self.conf.resume and \
+                self._workspace.is_done("compiled", str(self.spec.build)):
+            logging.info("reusing compiled project in '{}'"
+                         .format(str(self.compiled_dir)))
+            return
+        self._workspace.invalidate("compiled")
         self._project_builder.build(self.extracted_dir,
                                     self.compiled_dir,
                                     self.spec.build)
+        self._workspace.done("compiled", str(self.spec.build))
 
     def copr_set_config(self, username, login, token):
         """ Logs into copr with username, login and token.
@@ -295,13 +494,8 @@ class Base(object):
 
     @staticmethod
     def _compute_checksum(sources):
-        if sources.is_dir():
-            cmd = "find %s -type f -print0 | sort -z | xargs " \
-                  "-0 sha1sum | sha1sum" % path_to_str(sources.resolve())
-        else:
-            cmd = "cat %s | sha1sum" % path_to_str(sources.resolve())
-        logging.error(str(cmd))
-        return Command([cmd]).execute()[:7]
+        hasher = SourceHasher(get_cache_dir() / "checksums.json")
+        return hasher.hexdigest(sources.resolve())[:7]
 
     @property
     def all_dirs(self):
@@ -314,9 +508,7 @@ class Base(object):
 
     def _setup_workspace(self):
         """make sure all directories used later will exist"""
-        shutil.rmtree(str(self.base_dir), True)
-        for d in self.all_dirs:
-            d.mkdir(parents=True)
+        self._workspace.clear()
 
     # predictor methods are used for autocompletion of the field,
     # every guess_* method return list of strings matched ordered
@@ -328,10 +520,7 @@ class Base(object):
 
     def guess_provide(self):
         """ returns list of all known provides """
-        provides = set()
-        for pkg in self.sack.query():
-            provides.update(pkg.provides)
-        return sorted(provides)
+        return SackIndex.get(self.sack).provides()
 
     def guess_changelog_data(self):
         """ returns list of tuples (author, email) from git """
@@ -339,12 +528,13 @@ class Base(object):
 
     def guess_dependency(self):
         """ returns guess_provide() + all package names from repos """
-        names = map(lambda pkg: pkg.name, self.sack.query())
-        return sorted(set(names).union(set(self.guess_provide())))
+        return SackIndex.get(self.sack).dependencies()
 
     def guess_license(self):
         """ returns list of all known licenses """
-        licenses = set()
-        for pkg in self.sack.query():
-            licenses.update(pkg.license)
-        return sorted(licenses)
+        return SackIndex.get(self.sack).licenses()
+
+    def complete(self, kind, prefix, limit=10):
+        """ returns at most limit best matches of prefix, kind is one of
+            'provides', 'dependencies', 'names' or 'licenses' """
+        return SackIndex.get(self.sack).complete(kind, prefix, limit)
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from multiprocessing import get_context
+from pathlib import Path
+from rpg.headless import HeadlessRun
+from rpg.sack_index import CachedSack
+from rpg.spec import Spec
+import json
+import logging
+import os
+import re
+import time
+
+#: Base shared (copy-on-write) by forked worker processes
+_base = None
+
+
+class BatchRun:
+    """ Packages every project of manifest in headless mode. DNF sack and
+        plugin registry are loaded only once in main process, projects are
+        run in forked worker processes (at most jobs at once, one process
+        per project), each project has its own workspace (named after the
+        project) and log file.
+        Aggregated results contain status, step timings and errors of
+        every project.
+
+        Manifest is JSON list of projects, project is source or object
+        with keys "source", "name", "set" (spec overrides) and "targets".
+
+:Example:
+
+>>> from rpg import Base
+>>> from rpg.batch import BatchRun
+>>> base = Base()
+>>> batch = BatchRun(base, [
+        "https://github.com/example/ex_repo",
+        {"source": "/home/user/hello.tar.gz",
+         "set": {"Version": "1.0", "Requires": ["zlib"]},
+         "targets": [["fedora-22", "x86_64"]]}], jobs=4)
+>>> results = batch.run()
+>>> results["failed"]
+0
+"""
+
+    def __init__(self, base, manifest, jobs=None, log_dir=None):
+        self.base = base
+        self.projects = parse_manifest(manifest)
+        self.jobs = min(jobs or os.cpu_count() or 1,
+                        len(self.projects)) or 1
+        self.log_dir = Path(log_dir) if log_dir else \
+            base._log_dir / "batch"
+
+    def run(self):
+        """ Packages all projects and returns aggregated results """
+        global _base
+        start = time.perf_counter()
+        self._prepare()
+        if not self.log_dir.is_dir():
+            os.makedirs(str(self.log_dir))
+        _base = self.base
+        try:
+            with get_context("fork").Pool(
+                    self.jobs, initializer=_init_worker,
+                    maxtasksperchild=1) as pool:
+                reports = pool.map(
+                    _package,
+                    [(_p, str(self.log_dir / (_p["name"] + ".log")))
+                     for _p in self.projects],
+                    chunksize=1)
+        finally:
+            _base = None
+        failed = sum(1 for _r in reports if not _r["success"])
+        return OrderedDict([
+            ("jobs", self.jobs),
+            ("wall", time.perf_counter() - start),
+            ("succeeded", len(reports) - failed),
+            ("failed", failed),
+            ("projects", reports),
+        ])
+
+    def _prepare(self):
+        """ Loads sack and plugins, that are shared by all projects """
+        base = self.base
+        if base.conf.load_dnf and base.sack is None:
+            logging.info("loading DNF sack for batch")
+            base.sack = base.load_dnf_sack()
+        if isinstance(base.sack, CachedSack):
+            # forked workers share the filled sack instead of filling
+            # their own one
+            base.sack.sack
+        if getattr(base, "_plugin_engine", None) is None:
+            base.load_plugins()
+
+
+def parse_manifest(manifest):
+    """ Returns list of projects (dicts with name, source, overrides and
+        targets) from manifest, raises ValueError if it is not valid """
+    projects = []
+    names = set()
+    for index, entry in enumerate(manifest):
+        if isinstance(entry, str):
+            entry = {"source": entry}
+        if not isinstance(entry, dict) or "source" not in entry:
+            raise ValueError("project {} of manifest has no source"
+                             .format(index))
+        source = str(entry["source"])
+        name = entry.get("name") or "{:03d}-{}".format(
+            index, re.sub(r"[^\w.+-]", "_",
+                          source.rstrip("/").rsplit("/", 1)[-1]))
+        if not re.match(r"^[\w.+-]+$", name):
+            # name is part of paths of log and workspace
+            raise ValueError("name '{}' of project {} is not valid"
+                             .format(name, index))
+        if name in names:
+            raise ValueError("name '{}' is twice in manifest".format(name))
+        names.add(name)
+        overrides = []
+        for tag, value in sorted(entry.get("set", {}).items()):
+            if tag not in Spec._overridable:
+                raise ValueError("'{}' is not valid spec override of '{}'"
+                                 .format(tag, source))
+            if tag in Spec._appendants and isinstance(value, list):
+                overrides += [(tag, str(_v)) for _v in value]
+            else:
+                overrides.append((tag, str(value)))
+        projects.append({
+            "name": name,
+            "source": source,
+            "overrides": overrides,
+            "targets": [tuple(_t) for _t in entry.get("targets", [])],
+        })
+    return projects
+
+
+def load_manifest(path):
+    with open(str(path)) as manifest:
+        return json.load(manifest)
+
+
+def _init_worker():
+    """ Worker must not share sqlite connection of index with main
+        process """
+    sack = _base.sack
+    if isinstance(sack, CachedSack):
+        sack.index.reopen()
+
+
+def _package(args):
+    """ Runs headless pipeline of one project in worker process, log
+        of the project is written into its own file """
+    project, log = args
+    # sources of several projects may have the same content
+    _base.workspace_suffix = "-" + project["name"]
+    root = logging.getLogger()
+    formatter = root.handlers[0].formatter if root.handlers else None
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.FileHandler(log, "w")
+    handler.setFormatter(formatter)
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    report = HeadlessRun(_base, project["source"], project["overrides"],
+                         project["targets"], _base.conf.build_jobs).run()
+    report["name"] = project["name"]
+    report["log"] = log
+    report.move_to_end("name", last=False)
+    return report
+
+
+def main(base):
+    """ Runs batch configured on command line, writes aggregated results
+        as JSON to file given by --output (results.json in batch log
+        directory by default). Returns exit status. """
+    conf = base.conf
+    batch = BatchRun(base, load_manifest(conf.batch), conf.jobs)
+    results = batch.run()
+    output = conf.output or str(batch.log_dir / "results.json")
+    with open(output, "w") as out:
+        json.dump(results, out, indent=2)
+    logging.info("batch finished: {} succeeded, {} failed, results in '{}'"
+                 .format(results["succeeded"], results["failed"], output))
+    return 0 if not results["failed"] else 1
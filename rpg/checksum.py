@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+from rpg.utils import load_json_cache, save_json_cache
+import hashlib
+import logging
+import os
+import stat
+
+
+class SourceHasher:
+    """ Computes checksum of source file or whole source tree in-process.
+        Files are read in large chunks and hashed on all cores. Digests of
+        files are remembered in manifest under (path, size, mtime, inode)
+        key, so unchanged files are not read again on next import.
+
+:Example:
+
+>>> from pathlib import Path
+>>> from rpg.checksum import SourceHasher
+>>> hasher = SourceHasher(Path("~/.cache/rpg/checksums"))
+>>> hasher.hexdigest(Path("/home/user/project"))
+'5a7d2f1c...'
+"""
+
+    chunk_size = 1 << 20
+
+    def __init__(self, manifest_path=None, workers=None):
+        self.manifest_path = manifest_path
+        self.workers = workers or os.cpu_count() or 1
+        self._manifest = (load_json_cache(manifest_path)
+                          if manifest_path else {})
+
+    def hexdigest(self, path):
+        """ Returns sha1 hex digest of file or directory tree """
+        path = os.path.abspath(str(path))
+        if os.path.isdir(path):
+            digest = self._tree_digest(path)
+        else:
+            digest = self._file_digests([path])[path]
+        if self.manifest_path:
+            save_json_cache(self.manifest_path, self._manifest)
+        return digest
+
+    def _tree_digest(self, root):
+        files = []
+        links = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                _path = os.path.join(dirpath, name)
+                if os.path.islink(_path):
+                    links.append(_path)
+                else:
+                    files.append(_path)
+            # symlinks to directories are not followed by os.walk
+            links.extend(os.path.join(dirpath, name) for name in dirnames
+                         if os.path.islink(os.path.join(dirpath, name)))
+        entries = self._file_digests(files)
+        entries.update((_link, "->" + os.readlink(_link)) for _link in links)
+        self._forget_missing(root, entries)
+        tree = hashlib.sha1()
+        for _path in sorted(entries):
+            tree.update(("%s\0%s\n" % (os.path.relpath(_path, root),
+                                       entries[_path]))
+                        .encode("utf-8", "surrogateescape"))
+        return tree.hexdigest()
+
+    def _file_digests(self, files):
+        """ Returns dict path -> digest, hashes only files with changed
+            size, mtime or inode. Only regular files are hashed, reading
+            of FIFO (or device) could block forever. """
+        digests = {}
+        changed = []
+        for _path in files:
+            _stat = os.stat(_path)
+            if not stat.S_ISREG(_stat.st_mode):
+                continue
+            key = [_stat.st_size, _stat.st_mtime_ns, _stat.st_ino]
+            cached = self._manifest.get(_path)
+            if cached and cached[:3] == key:
+                digests[_path] = cached[3]
+            else:
+                changed.append((_path, key))
+        logging.debug("hashing %d of %d files"
+                      % (len(changed), len(files)))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            hashed = executor.map(lambda _f: self._hash_file(_f[0]), changed)
+            for (_path, key), digest in zip(changed, hashed):
+                self._manifest[_path] = key + [digest]
+                digests[_path] = digest
+        return digests
+
+    def _hash_file(self, path):
+        sha = hashlib.sha1()
+        with open(path, "rb") as _file:
+            chunk = _file.read(self.chunk_size)
+            while chunk:
+                sha.update(chunk)
+                chunk = _file.read(self.chunk_size)
+        return sha.hexdigest()
+
+    def _forget_missing(self, root, entries):
+        prefix = root.rstrip(os.sep) + os.sep
+        for _path in [_p for _p in self._manifest
+                      if _p.startswith(prefix) and _p not in entries]:
+            del self._manifest[_path]
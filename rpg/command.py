@@ -1,11 +1,39 @@
-from subprocess import check_output
-import rpm
+from subprocess import CalledProcessError, check_output
+from rpg import macros
+from rpg.profiler import count_spawn
 from rpg.utils import path_to_str
+import logging
+import os
+import re
+import shlex
+import shutil
+
+#: characters (outside of single quotes) that need shell
+_SHELL_CHARS = re.compile(r"[|&;<>()$`*?\[\]{}~#!\"\n]")
+_SINGLE_QUOTED = re.compile(r"'[^']*'")
+
+#: commands that change state of shell, so the rest of lines need it
+_SHELL_BUILTINS = frozenset([
+    ".", ":", "alias", "break", "cd", "continue", "eval", "exec", "exit",
+    "export", "local", "pushd", "popd", "read", "readonly", "return", "set",
+    "shift", "source", "trap", "ulimit", "umask", "unset"])
 
 
 class Command:
     """ representation of scripts in spec file with support of
-        RPM macro expansion (limited) """
+        RPM macro expansion (limited). Commands that are plain argument
+        lists are run without shell, simple file operations (cp, mv,
+        mkdir, rm -rf) are done in-process. Shell is used only when some
+        line needs it (pipes, redirections, variables, cd...).
+
+:Example:
+
+>>> from rpg.command import Command
+>>> Command("mkdir -p build").execute()     # no process is spawned
+''
+>>> Command("rpmbuild -bs hello.spec").execute()    # no shell
+>>> Command(["cd build", "cmake .. && make"]).execute()    # /bin/sh -c
+"""
 
     def __init__(self, cmdline=None):
         """ cmdline could be list of strings or string
@@ -40,11 +68,16 @@ class Command:
     def execute(self, work_dir=None):
         """ executes command in work_dir (instance of pathlib.Path),
             can raise CalledProcessError """
+        expanded = macros.expand_all(self._command_lines)
+        argvs = None if self.rpm_variables else _argv_lines(expanded)
+        if argvs is not None:
+            return _run_argvs(
+                argvs, str(work_dir.resolve()) if work_dir else None)
         cd_workdir = []
         if work_dir:
             cd_workdir = ["cd %s" % path_to_str(work_dir.resolve())]
         command_lines = self._assign_rpm_variables() + cd_workdir + \
-            [rpm.expandMacro(x) for x in self._command_lines]
+            expanded
         return self._cmd_output(command_lines)
 
     def _assign_rpm_variables(self):
@@ -52,5 +85,121 @@ class Command:
 
     @staticmethod
     def _cmd_output(command_lines, binary=False):
+        count_spawn()
         output = check_output(["/bin/sh", "-c", " && ".join(command_lines)])
         return output if binary else output.decode('utf-8')
+
+
+def _argv_lines(lines):
+    """ Returns list of argument lists of lines or None if some line
+        needs shell """
+    argvs = []
+    for line in lines:
+        if _SHELL_CHARS.search(_SINGLE_QUOTED.sub("", line)):
+            return None
+        try:
+            argv = shlex.split(line)
+        except ValueError:
+            return None
+        if not argv:
+            continue
+        if argv[0] in _SHELL_BUILTINS or "=" in argv[0]:
+            return None
+        argvs.append(argv)
+    return argvs
+
+
+def _run_argvs(argvs, cwd):
+    """ Runs argument lists one by one like 'line && line ...' in shell
+        would do, returns their joined output """
+    output = ""
+    for argv in argvs:
+        try:
+            if _run_builtin(argv, cwd):
+                continue
+        except OSError as err:
+            logging.error("'{}' failed: {}".format(" ".join(argv), str(err)))
+            raise CalledProcessError(1, argv, output)
+        count_spawn()
+        try:
+            output += check_output(argv, cwd=cwd).decode('utf-8')
+        except CalledProcessError as err:
+            raise CalledProcessError(
+                err.returncode, argv,
+                output + (err.output or b"").decode('utf-8'))
+        except OSError as err:
+            # e.g. command not found, shell would return 127
+            logging.error("'{}' failed: {}".format(" ".join(argv), str(err)))
+            raise CalledProcessError(127, argv, output)
+    return output
+
+
+def _run_builtin(argv, cwd):
+    """ Runs cp, mv, mkdir and rm -rf in-process, returns False if argv is
+        not one of them or uses options that aren't supported """
+    name = argv[0]
+    flags = "".join(_a[1:] for _a in argv[1:] if _a.startswith("-"))
+    paths = [os.path.join(cwd, _a) if cwd else _a
+             for _a in argv[1:] if not _a.startswith("-")]
+    if any(_a.startswith("--") or _a == "-" for _a in argv[1:]) or \
+            not paths:
+        return False
+    if name == "mkdir" and set(flags) <= set("p"):
+        for path in paths:
+            if not flags:
+                os.mkdir(path)
+            elif not os.path.isdir(path):
+                os.makedirs(path)
+        return True
+    if name == "rm" and "f" in flags and set(flags) <= set("rRf"):
+        for path in paths:
+            if os.path.isdir(path) and not os.path.islink(path):
+                if "r" not in flags.lower():
+                    raise IsADirectoryError(path)
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.unlink(path)
+        return True
+    if name == "cp" and set(flags) <= set("rRap") and len(paths) > 1:
+        return _copy(paths[:-1], paths[-1], flags)
+    if name == "mv" and not flags and len(paths) > 1:
+        targets = _targets(paths[:-1], paths[-1])
+        if targets is None or any(os.path.isdir(_t) for _, _t in targets):
+            return False
+        for source, target in targets:
+            shutil.move(source, target)
+        return True
+    return False
+
+
+def _copy(sources, dest, flags):
+    targets = _targets(sources, dest)
+    if targets is None:
+        return False
+    recursive = set(flags) & set("rRa")
+    for source, target in targets:
+        if os.path.isdir(source):
+            if not recursive or os.path.exists(target):
+                # merging of directories is left to cp
+                return False
+    for source, target in targets:
+        if os.path.isdir(source):
+            shutil.copytree(source, target, symlinks=True)
+        elif "a" in flags and os.path.islink(source):
+            os.symlink(os.readlink(source), target)
+        elif set(flags) & set("ap"):
+            shutil.copy2(source, target)
+        else:
+            shutil.copy(source, target)
+    return True
+
+
+def _targets(sources, dest):
+    """ Returns list of (source, target) pairs or None if more sources
+        are copied (moved) into destination that is not directory """
+    if os.path.isdir(dest):
+        return [(_s, os.path.join(dest, os.path.basename(_s.rstrip("/"))))
+                for _s in sources]
+    if len(sources) > 1:
+        return None
+    return [(sources[0], dest)]
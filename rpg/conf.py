@@ -1,6 +1,7 @@
 import argparse
 import logging
 from os import path
+from rpg.spec import Spec
 
 
 class Conf:
@@ -9,6 +10,15 @@ class Conf:
         self.directories = []
         self.exclude = []
         self.load_dnf = True
+        self.warm_recover = False
+        self.resume = True
+        self.headless = None
+        self.spec_overrides = []
+        self.targets = []
+        self.output = None
+        self.batch = None
+        self.jobs = None
+        self.build_jobs = None
 
     def parse_cmdline(self):
         self.parser = argparse.ArgumentParser(
@@ -31,6 +41,42 @@ class Conf:
         self.parser.add_argument(
             '--disable-dnf', dest='load_dnf', action='store_false',
             default=True, help='Disable loading DNF sack')
+        self.parser.add_argument(
+            '--warm-recover', dest='warm_recover', action='store_true',
+            default=False,
+            help='Fix build errors in chroot of the first mock build')
+        self.parser.add_argument(
+            '--no-resume', dest='resume', action='store_false',
+            default=True,
+            help='Run all phases again even if they were finished before')
+        self.parser.add_argument(
+            '--headless', type=str, dest='headless', default=None,
+            help='Package source (URL, archive or directory) without GUI '
+                 'and print JSON report', metavar='<source>')
+        self.parser.add_argument(
+            '--set', type=str, dest='spec_set', default=[],
+            help='Override spec tag in headless mode',
+            metavar='<tag>=<value>', nargs='+')
+        self.parser.add_argument(
+            '--target', type=str, dest='targets', default=[],
+            help='Build rpm for target in headless mode',
+            metavar=('<distro>', '<arch>'), nargs=2, action='append')
+        self.parser.add_argument(
+            '--batch', type=str, dest='batch', default=None,
+            help='Package all projects of JSON manifest without GUI',
+            metavar='<manifest>')
+        self.parser.add_argument(
+            '--jobs', type=int, dest='jobs', default=None,
+            help='Number of projects packaged at once in batch mode',
+            metavar='<n>')
+        self.parser.add_argument(
+            '--build-jobs', type=int, dest='build_jobs', default=None,
+            help='Number of rpm targets built at once in headless and '
+                 'batch mode', metavar='<n>')
+        self.parser.add_argument(
+            '--output', type=str, dest='output', default=None,
+            help='Write JSON report of headless or batch mode into file',
+            metavar='<file>')
         try:
             import argcomplete
             argcomplete.autocomplete(self.parser)
@@ -38,6 +84,23 @@ class Conf:
             pass
         args = self.parser.parse_args()
         self.load_dnf = args.load_dnf
+        self.warm_recover = args.warm_recover
+        self.resume = args.resume
+        self.headless = args.headless
+        self.targets = [tuple(_t) for _t in args.targets]
+        self.output = args.output
+        self.batch = args.batch
+        self.jobs = args.jobs
+        self.build_jobs = args.build_jobs
+        for jobs in (self.jobs, self.build_jobs):
+            if jobs is not None and jobs < 1:
+                self.parser.error("number of jobs must be positive")
+        for override in args.spec_set:
+            tag, sep, value = override.partition("=")
+            if not sep or tag not in Spec._overridable:
+                self.parser.error('"{}" is not valid spec override'
+                                  .format(override))
+            self.spec_overrides.append((tag, value))
         if args.plug_dir:
             for arg in args.plug_dir:
                 if path.isdir(arg):
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+from re import compile, MULTILINE
+from threading import Lock
+import os
+import struct
+
+#: content types recognized by content_type
+PATCH = "patch"
+ELF_SHARED = "elf-shared"
+ELF_EXECUTABLE = "elf-executable"
+ELF_OBJECT = "elf-object"
+AR_ARCHIVE = "ar-archive"
+GETTEXT = "gettext"
+PYTHON_BYTECODE = "python-bytecode"
+SCRIPT = "script"
+DIRECTORY = "directory"
+OTHER = "other"
+
+#: number of bytes sniffed from beginning of file
+HEAD_SIZE = 1 << 16
+
+_DIFF = compile(br"^--- [^\n]*\n\+\+\+ [^\n]*\n@@ ", MULTILINE)
+_ELF_TYPES = {1: ELF_OBJECT, 2: ELF_EXECUTABLE, 3: ELF_SHARED}
+_PT_INTERP = 3
+
+_cache = {}
+_lock = Lock()
+
+
+def content_type(path):
+    """ Returns content type of file sniffed from its first bytes. Results
+        are cached under inode and mtime of the file, so every file is read
+        only once per run.
+
+:Example:
+
+>>> from rpg.content_type import content_type, PATCH
+>>> content_type("0001-fix-build.patch") == PATCH
+True
+"""
+    path = str(path)
+    try:
+        _stat = os.stat(path)
+    except OSError:
+        return OTHER
+    key = (_stat.st_dev, _stat.st_ino, _stat.st_mtime_ns, _stat.st_size)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    if os.path.isdir(path):
+        result = DIRECTORY
+    else:
+        try:
+            with open(path, "rb") as content:
+                result = _sniff(content)
+        except OSError:
+            return OTHER
+    with _lock:
+        _cache[key] = result
+    return result
+
+
+def content_types(paths, workers=None):
+    """ Returns dict path -> content type, files are read in parallel """
+    paths = list(paths)
+    with ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1) as executor:
+        return dict(zip(paths, executor.map(content_type, paths)))
+
+
+def _sniff(content):
+    head = content.read(HEAD_SIZE)
+    if head.startswith(b"\x7fELF"):
+        return _elf_type(content, head)
+    if head.startswith(b"!<arch>\n"):
+        return AR_ARCHIVE
+    if head[:4] in (b"\xde\x12\x04\x95", b"\x95\x04\x12\xde"):
+        return GETTEXT
+    if _is_bytecode(head):
+        return PYTHON_BYTECODE
+    if head.startswith(b"#!"):
+        return SCRIPT
+    if b"\0" not in head and _DIFF.search(head):
+        return PATCH
+    return OTHER
+
+
+def _elf_type(content, head):
+    if len(head) < 64:
+        return OTHER
+    is_64 = head[4] == 2
+    order = "<" if head[5] == 1 else ">"
+    elf_type = _ELF_TYPES.get(struct.unpack(order + "H", head[16:18])[0],
+                              OTHER)
+    if elf_type != ELF_SHARED:
+        return elf_type
+    # position independent executables are ET_DYN too, unlike shared
+    # libraries they request program interpreter
+    if is_64:
+        phoff, = struct.unpack(order + "Q", head[32:40])
+        phentsize, phnum = struct.unpack(order + "HH", head[54:58])
+    else:
+        phoff, = struct.unpack(order + "I", head[28:32])
+        phentsize, phnum = struct.unpack(order + "HH", head[42:46])
+    content.seek(phoff)
+    headers = content.read(phentsize * phnum)
+    for offset in range(0, len(headers) - 3, phentsize or 1):
+        if struct.unpack(order + "I", headers[offset:offset + 4])[0] == \
+                _PT_INTERP:
+            return ELF_EXECUTABLE
+    return ELF_SHARED
+
+
+def _is_bytecode(head):
+    """ Magic number of python bytecode is 2 bytes number followed by
+        '\\r\\n', python 3 uses numbers from 3000, python 2 from 20121 """
+    if len(head) < 4 or head[2:4] != b"\r\n":
+        return False
+    magic, = struct.unpack("<H", head[:2])
+    return (3000 <= magic < 4000 or 20121 <= magic <= 62211) and \
+        not head[:2].isalnum()
@@ -0,0 +1,134 @@
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from pathlib import Path
+from threading import Lock
+import os
+import stat
+
+#: one indexed directory entry, is_file and is_dir follow symlinks
+FileEntry = namedtuple("FileEntry", ["path", "name", "is_file", "is_dir",
+                                     "is_link", "size", "mode"])
+
+_Contents = namedtuple("_Contents", ["entries", "by_name", "by_suffix",
+                                     "top_level"])
+
+
+class FileIndex:
+    """ Index of all entries of project directory built by single walk
+        (one lstat per entry). PluginEngine builds one index for each
+        phase, so plugins don't have to walk the same tree on their own.
+
+:Example:
+
+>>> from rpg.file_index import FileIndex
+>>> index = FileIndex.get(project_dir)
+>>> [entry.path for entry in index.with_suffix(".c", ".h")]
+>>> [entry.path for entry in index.named("CMakeLists.txt")]
+>>> [entry.path for entry in index.match("lib*.so*")]
+"""
+
+    _active = {}
+    _lock = Lock()
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.refresh()
+
+    @classmethod
+    def get(cls, root):
+        """ Returns index built for currently executed phase
+            or builds new one """
+        with cls._lock:
+            index = cls._active.get(cls._key(root))
+        return index if index is not None else cls(root)
+
+    @classmethod
+    @contextmanager
+    def activate(cls, root):
+        """ Builds index that is shared by all FileIndex.get calls
+            until the end of with block """
+        index = cls(root)
+        key = cls._key(root)
+        with cls._lock:
+            cls._active[key] = index
+        try:
+            yield index
+        finally:
+            with cls._lock:
+                cls._active.pop(key, None)
+
+    @staticmethod
+    def _key(root):
+        return os.path.realpath(str(root))
+
+    def refresh(self):
+        """ Walks the tree again, should be called by plugins that
+            create new files in project directory. New contents replace
+            the old ones at once, so plugins running concurrently never
+            see partially built index. """
+        contents = _Contents([], defaultdict(list), defaultdict(list), [])
+        if os.path.isdir(str(self.root)):
+            self._scan(str(self.root), True, contents)
+        self._contents = contents
+
+    def _scan(self, directory, top_level, contents):
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                _stat = os.lstat(path)
+            except OSError:
+                continue
+            is_link = stat.S_ISLNK(_stat.st_mode)
+            if is_link:
+                try:
+                    mode = os.stat(path).st_mode
+                except OSError:
+                    # broken link
+                    mode = 0
+            else:
+                mode = _stat.st_mode
+            indexed = FileEntry(Path(path), name, stat.S_ISREG(mode),
+                                stat.S_ISDIR(mode), is_link,
+                                _stat.st_size, _stat.st_mode)
+            contents.entries.append(indexed)
+            contents.by_name[name].append(indexed)
+            contents.by_suffix[os.path.splitext(name)[1]].append(indexed)
+            if top_level:
+                contents.top_level.append(indexed)
+            if stat.S_ISDIR(_stat.st_mode):
+                self._scan(path, False, contents)
+
+    def __iter__(self):
+        return iter(self._contents.entries)
+
+    def __len__(self):
+        return len(self._contents.entries)
+
+    def files(self):
+        """ Returns all files (or symlinks to files) in the tree """
+        return [_e for _e in self._contents.entries if _e.is_file]
+
+    def top_level(self):
+        """ Returns entries directly in root directory """
+        return list(self._contents.top_level)
+
+    def named(self, name):
+        """ Returns entries with given base name """
+        return list(self._contents.by_name.get(name, []))
+
+    def with_suffix(self, *suffixes):
+        """ Returns files with one of the suffixes (e.g. '.py'),
+            suffixes are case sensitive """
+        by_suffix = self._contents.by_suffix
+        return [_e for suffix in suffixes
+                for _e in by_suffix.get(suffix, []) if _e.is_file]
+
+    def match(self, pattern):
+        """ Returns entries which base name matches glob pattern """
+        return [_e for _e in self._contents.entries
+                if fnmatchcase(_e.name, pattern)]
@@ -1024,7 +1024,7 @@ class BuildPage(QtWidgets.QWizardPage):
         self.textBuildSRPMLabel.repaint()
         self.base.build_srpm()
         Command("cp " + path_to_str(self.base.srpm_path) + " " +
-                self.buildLocationEdit.text()).execute()
+                path_to_str(self.buildLocationEdit.text())).execute()
         self.base.final_path = self.buildLocationEdit.text()
         self.textBuildSRPMLabel.setText('Your source package was build in '
                                         + self.base.final_path)
@@ -1035,11 +1035,12 @@ class BuildPage(QtWidgets.QWizardPage):
         self.base.final_path = self.buildLocationEdit.text()
         arch = self.BuildArchEdit.currentText()
         distro = self.BuildDistroEdit.currentText()
-        self.base.build_rpm_recover(distro, arch)
+        self.base.build_rpm_recover(distro, arch,
+                                    warm=self.base.conf.warm_recover)
         packages = self.base.rpm_path
         for package in packages:
-            Command("cp " + str(package) + " " +
-                    self.base.final_path).execute()
+            Command("cp " + path_to_str(package) + " " +
+                    path_to_str(self.base.final_path)).execute()
         self.textBuildRPMLabel.setText(
             'Your package was build in ' + self.base.final_path)
 
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from rpg.command import Command
+from rpg.spec import Spec
+import json
+import logging
+import sys
+import time
+
+
+class _ErrorCollector(logging.Handler):
+    """ Collects messages of error records, plugin errors are only logged
+        by plugin engine """
+
+    def __init__(self):
+        super(_ErrorCollector, self).__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class HeadlessRun:
+    """ Runs the whole pipeline of Base without GUI - analyses of all
+        phases, build and installation of project, srpm and (optionally)
+        rpms for targets. Spec overrides are applied after every step, so
+        they always win over values guessed by plugins. At most build_jobs
+        targets (all by default) are built at once. The run stops on
+        the first failed step, report contains resulting spec, timings of
+        steps and plugin hooks and all errors.
+
+:Example:
+
+>>> from rpg import Base
+>>> from rpg.headless import HeadlessRun
+>>> base = Base()
+>>> run = HeadlessRun(base, "https://github.com/example/ex_repo",
+                      overrides=[("Version", "0.6.11")],
+                      targets=[("fedora-22", "x86_64")])
+>>> report = run.run()
+>>> report["errors"]
+[]
+"""
+
+    def __init__(self, base, source, overrides=(), targets=(),
+                 build_jobs=None):
+        self.base = base
+        self.source = source
+        self.overrides = list(overrides)
+        for key, _ in self.overrides:
+            if key not in Spec._overridable:
+                raise ValueError("'{}' is not valid spec override"
+                                 .format(key))
+        self.targets = [tuple(_t) for _t in targets]
+        self.build_jobs = build_jobs
+        self.timings = OrderedDict()
+        self.errors = []
+        self.results = OrderedDict()
+
+    def steps(self):
+        """ Returns list of (name, function) of pipeline steps """
+        base = self.base
+        steps = []
+        if base.conf.load_dnf and base.sack is None:
+            steps.append(("load_dnf_sack", self._load_dnf_sack))
+        if getattr(base, "_plugin_engine", None) is None:
+            steps.append(("load_plugins", base.load_plugins))
+        steps += [
+            ("extraction",
+             lambda: base.load_project_from_url(self.source)),
+            ("extracted", base.run_extracted_source_analysis),
+            ("patched", base.run_patched_source_analysis),
+            ("build", base.build_project),
+            ("compiled", base.run_compiled_source_analysis),
+            ("install", base.install_project),
+            ("installed", base.run_installed_source_analysis),
+            ("srpm", self._build_srpm),
+        ]
+        if self.targets:
+            steps.append(("rpm", self._build_rpms))
+        return steps
+
+    def run(self):
+        """ Executes all steps and returns report """
+        collector = _ErrorCollector()
+        logging.getLogger().addHandler(collector)
+        try:
+            for name, step in self.steps():
+                collector.messages = []
+                start = time.perf_counter()
+                try:
+                    step()
+                    self.apply_overrides()
+                except Exception as err:
+                    logging.exception("headless step {} failed".format(name))
+                    self.errors.append(OrderedDict([
+                        ("step", name),
+                        ("type", type(err).__name__),
+                        ("message", str(err)),
+                    ]))
+                    break
+                finally:
+                    self.timings[name] = time.perf_counter() - start
+                    self.errors += [OrderedDict([("step", name),
+                                                 ("type", "log"),
+                                                 ("message", _m)])
+                                    for _m in collector.messages
+                                    if not _m.startswith("headless step")]
+        finally:
+            logging.getLogger().removeHandler(collector)
+        return self.report()
+
+    def apply_overrides(self):
+        spec = self.base.spec
+        for key, value in self.overrides:
+            if key in spec._appendants:
+                getattr(spec, key).add(value)
+            elif isinstance(getattr(spec, key), Command):
+                setattr(spec, key, Command(value))
+            else:
+                setattr(spec, key, value)
+
+    def report(self):
+        """ Returns structured report that can be serialized to JSON """
+        try:
+            profile = self.base._plugin_engine.profiler.report()
+        except AttributeError:
+            profile = None
+        return OrderedDict([
+            ("source", str(self.source)),
+            ("success", not any(_e["type"] != "log" for _e in self.errors)),
+            ("spec", str(self.base.spec)),
+            ("results", self.results),
+            ("timings", OrderedDict([
+                ("steps", self.timings),
+                ("total", sum(self.timings.values())),
+                ("plugins", profile),
+            ])),
+            ("errors", self.errors),
+        ])
+
+    def _load_dnf_sack(self):
+        self.base.sack = self.base.load_dnf_sack()
+
+    def _build_srpm(self):
+        self.base.build_srpm()
+        self.results["srpm"] = str(self.base.srpm_path)
+
+    def _build_rpms(self):
+        rpms = OrderedDict()
+        failed = []
+        for target, result in sorted(self.base.build_rpms(
+                self.targets, self.build_jobs).items()):
+            rpms["-".join(target)] = OrderedDict([
+                ("return_code", result.return_code),
+                ("rpms", [str(_p) for _p in result.rpms]),
+                ("errors", [str(_e) for _e in result.errors]),
+                ("logs", str(result.mock_logs)),
+            ])
+            if result.return_code:
+                failed.append("-".join(target))
+        self.results["rpms"] = rpms
+        if failed:
+            raise RuntimeError("rpm build failed for " + ", ".join(failed))
+
+
+def main(base, out=None):
+    """ Runs headless pipeline configured on command line and writes its
+        report as JSON to file given by --output (standard output by
+        default). Returns exit status. """
+    conf = base.conf
+    report = HeadlessRun(base, conf.headless, conf.spec_overrides,
+                         conf.targets, conf.build_jobs).run()
+    base.write_profile_report()
+    if conf.output:
+        with open(conf.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        out = out or sys.stdout
+        json.dump(report, out, indent=2)
+        out.write("\n")
+    return 0 if report["success"] else 1
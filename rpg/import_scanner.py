@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from rpg.utils import load_json_cache, save_json_cache
+from re import compile, MULTILINE
+import ast
+import logging
+import os
+import sys
+
+_IMPORT = compile(r'^[ \t]*(?:from[ \t]+([\w.]+)[ \t]+import|'
+                  r'import[ \t]+([\w.]+(?:[ \t]*,[ \t]*[\w.]+)*))',
+                  MULTILINE)
+
+
+class ImportScanner:
+    """ Collects modules imported by python sources from their syntax trees
+        and resolves every distinct top level module to its file only once.
+        Sources are parsed on all cores, files of resolved modules are
+        remembered across runs for the same interpreter and sys.path.
+        Modules that can't be found are looked up again in every run, they
+        may be installed meanwhile.
+
+        Only modules imported by the sources are resolved, not modules
+        they import (as ModuleFinder did), packages providing them require
+        their own dependencies.
+
+:Example:
+
+>>> from pathlib import Path
+>>> from rpg.import_scanner import ImportScanner
+>>> scanner = ImportScanner(Path("~/.cache/rpg/python_imports.json"))
+>>> scanner.scan(["/home/user/project/app.py"], local=["app"])
+{'/usr/lib64/python3.4/lib-dynload/math.cpython-34m.so', ...}
+"""
+
+    #: number of sources parsed by one worker process at once
+    chunk_size = 64
+
+    def __init__(self, cache_path=None, workers=None):
+        self.cache_path = cache_path
+        self.workers = workers or os.cpu_count() or 1
+        self._key = "%s\0%s" % (sys.version, os.pathsep.join(sys.path))
+        cache = load_json_cache(cache_path) if cache_path else {}
+        self._origins = cache.get(self._key, {})
+        self._missing = set()
+        self._changed = False
+
+    def scan(self, sources, local=()):
+        """ Returns set of files of modules imported by sources, modules
+            with name from local (modules of the project) are skipped """
+        modules = self.imported_modules(sources) - set(local)
+        files = set()
+        for module in sorted(modules):
+            origin = self.resolve(module)
+            if origin:
+                files.add(origin)
+        self.save()
+        return files
+
+    def imported_modules(self, sources):
+        """ Returns set of top level modules imported by sources """
+        sources = [str(_s) for _s in sources]
+        modules = set()
+        if len(sources) <= self.chunk_size or self.workers == 1:
+            for source in sources:
+                modules |= _imported_modules(source)
+        else:
+            logging.debug("parsing %d python files" % len(sources))
+            chunks = [sources[i:i + self.chunk_size]
+                      for i in range(0, len(sources), self.chunk_size)]
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for _modules in executor.map(_chunk_modules, chunks):
+                    modules |= _modules
+        return modules
+
+    def resolve(self, module):
+        """ Returns file of top level module or None if it is builtin
+            or can't be found """
+        if module in self._missing:
+            return None
+        if module in self._origins:
+            origin = self._origins[module]
+            if origin is None or os.path.exists(origin):
+                return origin
+        try:
+            spec = find_spec(module)
+        except (ImportError, ValueError, AttributeError) as err:
+            logging.debug("module %s can't be resolved: %s"
+                          % (module, str(err)))
+            spec = None
+        if spec is None:
+            # module may be installed before next run
+            self._missing.add(module)
+            if self._origins.pop(module, False) is not False:
+                self._changed = True
+            return None
+        origin = spec.origin
+        if not origin or not os.path.isabs(origin):
+            # 'built-in', 'frozen', namespace package ...
+            origin = None
+        self._origins[module] = origin
+        self._changed = True
+        return origin
+
+    def save(self):
+        if self.cache_path and self._changed:
+            cache = load_json_cache(self.cache_path)
+            cache[self._key] = self._origins
+            save_json_cache(self.cache_path, cache)
+            self._changed = False
+
+
+def _chunk_modules(paths):
+    """ Returns set of top level modules imported by chunk of files,
+        run in worker process """
+    modules = set()
+    for path in paths:
+        modules |= _imported_modules(path)
+    return modules
+
+
+def _imported_modules(path):
+    """ Returns set of top level modules imported by python file,
+        relative imports are skipped """
+    try:
+        with open(path, "rb") as source:
+            content = source.read()
+    except OSError as err:
+        logging.debug("can't read '%s': %s" % (path, str(err)))
+        return set()
+    try:
+        tree = ast.parse(content, path)
+    except (SyntaxError, ValueError):
+        return _imported_modules_re(content.decode("utf-8", "replace"))
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and \
+                node.module:
+            modules.add(node.module.split(".")[0])
+    return modules
+
+
+def _imported_modules_re(content):
+    """ Fallback for sources that can't be parsed by running
+        interpreter (e.g. python 2 syntax) """
+    modules = set()
+    for _from, _import in _IMPORT.findall(content):
+        for name in (_from or _import).split(","):
+            name = name.strip().split(".")[0]
+            if name:
+                modules.add(name)
+    return modules
@@ -0,0 +1,269 @@
+from concurrent.futures import ProcessPoolExecutor
+from rpg.utils import load_json_cache, save_json_cache
+from re import compile, MULTILINE
+import logging
+import os
+
+_INCLUDE = compile(
+    br'^[ \t]*#[ \t]*include(_next)?[ \t]*([<"])([^>"\n]+)[>"]', MULTILINE)
+
+
+class IncludeScanner:
+    """ Follows #include directives of C/C++ sources against system include
+        directories in-process. All branches of conditional directives are
+        followed. Transitive includes of every header are computed only
+        once per run (headers that include each other share them). Direct
+        includes of system headers and transitive includes of system
+        headers included by project files are remembered across runs
+        together with mtimes of files and directories they depend on.
+        Large projects are scanned on all cores.
+
+:Example:
+
+>>> from pathlib import Path
+>>> from rpg.include_scanner import IncludeScanner
+>>> scanner = IncludeScanner(Path("~/.cache/rpg/includes.json"))
+>>> scanner.scan(["/home/user/project/main.c"])
+{'/usr/include/stdio.h', '/usr/include/features.h', ...}
+"""
+
+    system_dirs = ("/usr/local/include", "/usr/include")
+
+    #: number of sources scanned by one worker process
+    shard_size = 512
+
+    def __init__(self, cache_path=None, system_dirs=None, workers=None):
+        self.cache_path = cache_path
+        if system_dirs is not None:
+            self.system_dirs = tuple(system_dirs)
+        self.workers = workers or os.cpu_count() or 1
+        cached = load_json_cache(cache_path) if cache_path else {}
+        self._cached = {"direct": cached.get("direct", {}),
+                        "closures": cached.get("closures", {})}
+        self._direct = {}
+        self._closure = {}
+        self._deps = {}
+        self._watched = {}
+        self._resolved = {}
+        self._mtimes = {}
+
+    def scan(self, sources):
+        """ Returns set of headers included (even transitively)
+            by sources """
+        sources = [os.path.abspath(str(_s)) for _s in sources]
+        if len(sources) <= self.shard_size or self.workers == 1:
+            headers = self._scan_sources(sources)
+        else:
+            headers = set()
+            shards = [sources[i:i + self.shard_size]
+                      for i in range(0, len(sources), self.shard_size)]
+            logging.debug("scanning includes of %d files in %d shards"
+                          % (len(sources), len(shards)))
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for _headers, _changed in executor.map(
+                        _scan_shard, [(self.cache_path, self.system_dirs,
+                                       _shard) for _shard in shards]):
+                    headers |= _headers
+                    for section, entries in _changed.items():
+                        self._cached[section].update(entries)
+        self.save()
+        return headers
+
+    def save(self):
+        if self.cache_path:
+            save_json_cache(self.cache_path, self._cached)
+
+    def _scan_sources(self, sources):
+        headers = set()
+        for source in sources:
+            headers |= self._includes_of(source)
+        return headers
+
+    def _includes_of(self, path):
+        """ Returns all headers path includes. Include graph is walked
+            depth first and closure of every strongly connected component
+            (headers including each other) is stored as soon as the walk
+            leaves it, so no header is walked twice. """
+        closure = self._known_closure(path)
+        if closure is not None:
+            return closure
+        order = {path: 0}
+        low = {path: 0}
+        stack = [path]
+        on_stack = set(stack)
+        work = [(path, iter(self._direct_includes(path)))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor in order:
+                    if successor in on_stack:
+                        low[node] = min(low[node], order[successor])
+                    continue
+                if self._known_closure(successor) is not None:
+                    continue
+                order[successor] = low[successor] = len(order)
+                stack.append(successor)
+                on_stack.add(successor)
+                work.append((successor,
+                             iter(self._direct_includes(successor))))
+                break
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    self._finish(component)
+        return self._closure[path]
+
+    def _finish(self, component):
+        """ Stores closure of component whose successors are finished """
+        members = set(component)
+        reach = set()
+        deps = {}
+        for member in component:
+            for header in self._direct_includes(member):
+                reach.add(header)
+                if header not in members:
+                    reach |= self._closure[header]
+                    deps.update(self._deps.get(header, {}))
+            deps.update((_p, self._mtime(_p))
+                        for _p in self._watched.get(member, ()))
+        for member in component:
+            self._closure[member] = frozenset(reach - set([member]))
+            if self._is_system(member):
+                self._deps[member] = deps
+            else:
+                # closures of system headers included from project are
+                # entry points of next runs
+                for header in self._direct_includes(member):
+                    if self._is_system(header) and header in self._deps:
+                        self._cached["closures"][header] = [
+                            sorted(self._closure[header]),
+                            self._deps[header]]
+
+    def _known_closure(self, path):
+        """ Returns closure computed in this run or valid closure from
+            persistent cache """
+        closure = self._closure.get(path)
+        if closure is not None or not self._is_system(path):
+            return closure
+        entry = self._cached["closures"].get(path)
+        if entry and all(self._mtime(_p) == _mtime
+                         for _p, _mtime in entry[1].items()):
+            closure = frozenset(entry[0])
+            self._closure[path] = closure
+            self._deps[path] = entry[1]
+            return closure
+        return None
+
+    def _direct_includes(self, path):
+        """ Returns resolved paths of headers path includes directly """
+        direct = self._direct.get(path)
+        if direct is not None:
+            return direct
+        includes = self._parse(path)
+        directory = os.path.dirname(path)
+        direct = []
+        # new files in these directories may change the includes
+        watched = set([path, directory])
+        for include_next, kind, name in includes:
+            header, dirs = self._resolve(directory, kind, name,
+                                         path if include_next else None)
+            watched |= dirs
+            if header is not None:
+                direct.append(header)
+        self._direct[path] = direct
+        self._watched[path] = watched
+        return direct
+
+    def _parse(self, path):
+        """ Returns list of (include_next, kind, name) of path, entries of
+            system headers are taken from persistent cache if possible """
+        mtime = self._mtime(path)
+        if mtime is None:
+            return []
+        system = self._is_system(path)
+        if system:
+            cached = self._cached["direct"].get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        try:
+            with open(path, "rb") as source:
+                content = source.read()
+        except OSError as err:
+            logging.debug("can't read '%s': %s" % (path, str(err)))
+            return []
+        includes = [[bool(_next), kind.decode(),
+                     name.decode("utf-8", "surrogateescape").strip()]
+                    for _next, kind, name in _INCLUDE.findall(content)]
+        if system:
+            self._cached["direct"][path] = [mtime, includes]
+        return includes
+
+    def _resolve(self, directory, kind, name, include_next=None):
+        """ Returns resolved header (or None) and directories that would
+            contain candidates of the header """
+        key = (directory if kind == '"' else None, name, include_next)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        candidates = [os.path.join(_dir, name) for _dir in self.system_dirs]
+        if kind == '"':
+            candidates.insert(0, os.path.join(directory, name))
+        header = None
+        dirs = set()
+        for candidate in candidates:
+            candidate = os.path.normpath(candidate)
+            if candidate != include_next and os.path.isfile(candidate):
+                header = candidate
+                break
+            dirs.add(_existing_parent(candidate))
+        self._resolved[key] = (header, dirs)
+        return header, dirs
+
+    def _mtime(self, path):
+        try:
+            return self._mtimes[path]
+        except KeyError:
+            pass
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        self._mtimes[path] = mtime
+        return mtime
+
+    def _is_system(self, path):
+        return any(path.startswith(_dir + os.sep)
+                   for _dir in self.system_dirs)
+
+
+def _existing_parent(path):
+    parent = os.path.dirname(path)
+    while parent and not os.path.isdir(parent) and \
+            parent != os.path.dirname(parent):
+        parent = os.path.dirname(parent)
+    return parent
+
+
+def _scan_shard(args):
+    """ Scans one shard of sources in worker process, returns found headers
+        and newly cached entries """
+    cache_path, system_dirs, sources = args
+    scanner = IncludeScanner(cache_path, system_dirs, workers=1)
+    known = dict((_section, dict(_entries))
+                 for _section, _entries in scanner._cached.items())
+    headers = scanner._scan_sources(sources)
+    return (headers, dict(
+        (_section, dict((_path, _entry) for _path, _entry in _entries.items()
+                        if known[_section].get(_path) != _entry))
+        for _section, _entries in scanner._cached.items()))
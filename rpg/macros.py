@@ -0,0 +1,84 @@
+from threading import Lock
+import rpm
+
+#: maximal number of remembered expansions, cache is cleared when it is
+#: exceeded
+CACHE_SIZE = 4096
+
+#: expansions with side effects or results that may differ on every call
+_DYNAMIC = ("%(", "%{lua:", "%{expand:")
+
+_cache = {}
+_generation = [0]
+_lock = Lock()
+
+
+def expand(string):
+    """ Returns string with RPM macros expanded. Expansions are remembered
+        until rpg defines or undefines a macro, strings without macros
+        and shell or lua expansions are not cached.
+
+:Example:
+
+>>> from rpg import macros
+>>> macros.expand("%{python3_sitelib}")
+'/usr/lib/python3.4/site-packages'
+>>> macros.define("_topdir", "/tmp/rpmbuild")
+>>> macros.expand_all(["%{_topdir}/SOURCES", "make"])
+['/tmp/rpmbuild/SOURCES', 'make']
+"""
+    return expand_all([string])[0]
+
+
+def expand_all(strings):
+    """ Returns list of strings with RPM macros expanded, cache is looked
+        up for all of them at once """
+    strings = list(strings)
+    result = list(strings)
+    missing = []
+    with _lock:
+        generation = _generation[0]
+        for index, string in enumerate(strings):
+            if "%" not in string:
+                continue
+            expanded = _cache.get(string)
+            if expanded is None:
+                missing.append(index)
+            else:
+                result[index] = expanded
+    if not missing:
+        return result
+    expanded = {}
+    for index in missing:
+        string = strings[index]
+        if string not in expanded:
+            expanded[string] = rpm.expandMacro(string)
+        result[index] = expanded[string]
+    with _lock:
+        # macros were (un)defined during expansion, results may be stale
+        if generation == _generation[0]:
+            if len(_cache) + len(expanded) > CACHE_SIZE:
+                _cache.clear()
+            _cache.update((_s, _e) for _s, _e in expanded.items()
+                          if not any(_d in _s for _d in _DYNAMIC))
+    return result
+
+
+def define(name, value):
+    """ Defines macro name with value and forgets all expansions """
+    rpm.addMacro(name, value)
+    invalidate()
+
+
+def undefine(name):
+    """ Undefines macro and forgets all expansions """
+    rpm.delMacro(name)
+    invalidate()
+
+
+def invalidate():
+    """ Forgets all expansions, has to be called whenever macros are
+        changed outside of this module """
+    with _lock:
+        _generation[0] += 1
+        _cache.clear()
@@ -1,7 +1,12 @@
+from collections import namedtuple
 import logging
+import os
 import re
+import selectors
 from rpg.command import Command
+from rpg.profiler import count_spawn
 from rpg.utils import path_to_str
+from shutil import rmtree
 import subprocess
 import tempfile
 from pathlib import Path
@@ -19,6 +24,54 @@ class BuildException(Exception):
         return "\n".join(self.errors)
 
 
+#: error found in mock output (source "mock") or in its log
+BuildError = namedtuple("BuildError", ["source", "line", "fatal"])
+
+
+#: result of build of one target, rpms are moved into output_dir
+BuildResult = namedtuple("BuildResult", ["return_code", "errors",
+                                         "output_dir", "rpms", "mock_logs"])
+
+
+class _LineBuffer(object):
+    """ Splits chunks of bytes to decoded lines, keeps unfinished line """
+
+    def __init__(self):
+        self._rest = b""
+
+    def feed(self, data):
+        lines = (self._rest + data).split(b"\n")
+        self._rest = lines.pop()
+        return [_l.decode("utf-8", "replace") + "\n" for _l in lines]
+
+    def flush(self):
+        rest, self._rest = self._rest, b""
+        return [rest.decode("utf-8", "replace")] if rest else []
+
+
+class _LogTail(_LineBuffer):
+    """ Reads lines appended to log file since last read """
+
+    def __init__(self, path):
+        super(_LogTail, self).__init__()
+        self.path = path
+        self._offset = 0
+
+    def read(self):
+        try:
+            with open(str(self.path), "rb") as log:
+                if os.fstat(log.fileno()).st_size < self._offset:
+                    # log was truncated
+                    self._offset = 0
+                    self._rest = b""
+                log.seek(self._offset)
+                data = log.read()
+        except OSError:
+            return []
+        self._offset += len(data)
+        return self.feed(data)
+
+
 class PackageBuilder(object):
     """ Builder of RPM packages with use of Mock
 
@@ -33,16 +86,19 @@ class PackageBuilder(object):
 >>> output_dir = Path("/tmp/rpg-854ABCD50/")
 >>> pck_builder.build_srpm(spec_file, tarball, output_dir)
 >>> pck_builder.build_rpm(output_dir / "*.src.rpm", "fedora-22",
-                          "x86-64", output_dir)
+                          "x86-64", output_dir,
+                          on_error=lambda error: print(error.line))
 """
     _regex = re.compile(r"[eE][rR][rR][oO][rR]|" +
                         r"[eE][xX][cC][eE][pP][tT][iI][oO][nN]|" +
                         r"[cC][oO][mM][mM][aA][nN][dD] [nN][oO][tT] " +
                         r"[fF][oO][uU][nN][dD]")
 
-    def __init__(self):
+    def __init__(self, uniqueext=None):
         self.temp_dir = Path(tempfile.gettempdir())
+        self.uniqueext = uniqueext
         self.mock_logs = Path()
+        self.last_stage = None
 
     @staticmethod
     def build_srpm(spec_file, tarball, output_dir):
@@ -50,18 +106,11 @@ class PackageBuilder(object):
             output directory """
         Command("rpmdev-setuptree").execute()
         Command("cp " + path_to_str(tarball) +
-                ' $(rpm --eval "%{_topdir}")/SOURCES').execute()
+                " %{_topdir}/SOURCES").execute()
         output = Command("rpmbuild -bs " + path_to_str(spec_file)).execute()
         Command("mv " + path_to_str(output.split()[-1]) +
                 " " + path_to_str(output_dir)).execute()
 
-    @staticmethod
-    def _check_logs(path):
-        with open(str(path / "build.log")) as build_log:
-            for line in build_log.readlines():
-                if PackageBuilder._regex.search(line):
-                    yield line
-
     @staticmethod
     def _move_files(output, files):
         if not output.exists() and not output.is_dir():
@@ -73,38 +122,136 @@ class PackageBuilder(object):
             except:
                 pass
 
-    def build_rpm(self, srpm, distro, arch, output_dir):
+    def build_rpm(self, srpm, distro, arch, output_dir, on_error=None,
+                  keep_chroot=False, clean=False):
         """ builds rpm from source RPM to distro and architecture
-            binary RPM into output_dir """
-        self.build_ret_code = 0
-
-        def check_output(proc):
-            while proc.poll() is None:
-                line = proc.stdout.readline().decode("utf-8")
-                if self._regex.search(line):
-                    yield line
-            self.build_ret_code = proc.returncode
-
-        _ret = list(
-            check_output(
-                subprocess.Popen(
-                    [
-                        "mock", "--no-clean",
-                        "--verbose",
-                        "--root", distro + '-' + arch,
-                        "--rebuild", path_to_str(srpm),
-                        "--resultdir=" + path_to_str(self.temp_dir)
-                    ],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT
-                )
-            )
-        ) + list(self._check_logs(self.temp_dir))
-        self._move_files(output_dir, self.temp_dir.glob("*.rpm"))
-        self.mock_logs = output_dir / "mock_logs"
-        self._move_files(self.mock_logs, self.temp_dir.glob("*.log"))
+            binary RPM into output_dir. Output of mock and its build log
+            are analysed while mock runs, on_error is called with every
+            BuildError found. Build is aborted as soon as unrecoverable
+            error is found. If keep_chroot is True, build directory is left
+            in chroot, so failed stage can be run again by build_stage.
+            If clean is True, chroot is scrubbed before the build, so
+            packages installed by install_packages don't hide missing
+            BuildRequires. """
+        resultdir = Path(tempfile.mkdtemp(prefix="rpg-mock-",
+                                          dir=str(self.temp_dir)))
+        try:
+            _ret = self._run_mock(
+                ["mock"] + ([] if clean else ["--no-clean"]) +
+                (["--no-cleanup-after"] if keep_chroot else []) +
+                ["--verbose"] + self._root_args(distro, arch) +
+                [
+                    "--rebuild", str(srpm),
+                    "--resultdir=" + str(resultdir)
+                ], on_error, resultdir)
+            self._move_files(output_dir, resultdir.glob("*.rpm"))
+            self.mock_logs = output_dir / "mock_logs"
+            self._move_files(self.mock_logs, resultdir.glob("*.log"))
+        finally:
+            rmtree(str(resultdir), True)
+        raise BuildException(_ret, self.build_ret_code)
+
+    def _root_args(self, distro, arch):
+        return (["--root", distro + '-' + arch] +
+                (["--uniqueext=" + self.uniqueext] if self.uniqueext
+                 else []))
+
+    #: rpmbuild options that run stage (and following ones) again
+    _short_circuit = {"build": "-bc", "install": "-bi", "check": "-bi"}
+
+    def can_build_stage(self, stage):
+        return stage in self._short_circuit
+
+    def install_packages(self, distro, arch, packages):
+        """ Installs packages into (warm) chroot of distro and arch,
+            raises CalledProcessError if mock fails """
+        count_spawn()
+        subprocess.check_output(["mock"] + self._root_args(distro, arch) +
+                                ["--install"] + sorted(packages),
+                                stderr=subprocess.STDOUT)
+
+    def build_stage(self, spec_name, distro, arch, stage, on_error=None):
+        """ Runs stage (last_stage of previous build) of rpmbuild again
+            inside chroot left by build_rpm with keep_chroot. Raises
+            BuildException like build_rpm. """
+        _ret = self._run_mock(
+            ["mock"] + self._root_args(distro, arch) +
+            [
+                "--unpriv", "--cwd=/builddir/build",
+                "--chroot",
+                "rpmbuild " + self._short_circuit[stage] +
+                " --short-circuit --nodeps /builddir/build/SPECS/" +
+                spec_name
+            ], on_error)
         raise BuildException(_ret, self.build_ret_code)
 
+    def _run_mock(self, args, on_error, resultdir=None):
+        """ Runs mock and returns lines with errors, sets build_ret_code
+            and last_stage (last stage rpmbuild executed). Logs in resultdir
+            are analysed too. """
+        self.last_stage = None
+        count_spawn()
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        _ret = []
+        aborted = False
+        for error in self._analyse_build(proc, resultdir):
+            if on_error:
+                on_error(error)
+            if error.source != "root.log":
+                _ret.append(error.line)
+            if error.fatal and not aborted:
+                logging.error("unrecoverable build error, stopping mock: " +
+                              error.line)
+                proc.terminate()
+                aborted = True
+        self.build_ret_code = proc.wait()
+        return _ret
+
+    #: result logs of mock that are analysed during the build
+    _tailed_logs = ("build.log", "root.log")
+
+    #: errors that can't be fixed by adding requires, build is stopped
+    _fatal_regex = re.compile(r"No space left on device|"
+                              r"Could not find required config file|"
+                              r"Cannot retrieve repository metadata|"
+                              r"Failed to download metadata")
+
+    def _analyse_build(self, proc, resultdir=None, interval=0.5):
+        """ Yields BuildErrors from mock output and result logs as they
+            are written, until mock exits and its output is drained """
+        tails = [_LogTail(resultdir / log) for log in self._tailed_logs
+                 if resultdir]
+        output = _LineBuffer()
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select(interval):
+                    data = os.read(key.fileobj.fileno(), 65536)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                    for line in output.feed(data):
+                        yield from self._classify("mock", line)
+                for tail in tails:
+                    for line in tail.read():
+                        yield from self._classify(tail.path.name, line)
+        proc.wait()
+        for line in output.flush():
+            yield from self._classify("mock", line)
+        for tail in tails:
+            for line in tail.read() + tail.flush():
+                yield from self._classify(tail.path.name, line)
+
+    _stage_regex = re.compile(r"Executing\(%(\w+)\)")
+
+    def _classify(self, source, line):
+        stage = self._stage_regex.search(line)
+        if stage:
+            self.last_stage = stage.group(1)
+        fatal = bool(self._fatal_regex.search(line))
+        if fatal or (source != "root.log" and self._regex.search(line)):
+            yield BuildError(source, line, fatal)
+
     @staticmethod
     def fetch_repos(dist, arch):
         """ Initialize mock on distro and architecture for example:
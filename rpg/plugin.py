@@ -25,3 +25,16 @@ class Plugin:
         def mock_recover(self, log, spec):
             pass
     """
+
+    #: names of plugins whose hooks have to finish before hooks of this
+    #: plugin are executed in the same phase
+    after = ()
+
+    #: spec attributes read by hooks - dict of hook name and tuple
+    #: of attribute names, e.g. {"installed": ("required_files",)}
+    reads = None
+
+    #: spec attributes written by hooks, format is the same as of reads.
+    #: Hook that is not declared here is never executed concurrently with
+    #: other plugins.
+    writes = None
@@ -1,6 +1,11 @@
-from rpg.plugin import Plugin
-import inspect
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from heapq import heappop, heappush
+from rpg.file_index import FileIndex
+from rpg.plugin_registry import LazyPlugin, PluginRegistry
+from rpg.profiler import HookProfiler
+from rpg.utils import get_cache_dir
 import logging
+import os
 import os.path
 import traceback
 
@@ -30,24 +35,26 @@ class PluginEngine:
 
     phases = ("extracted", "patched", "compiled", "installed", "package_build")
 
-    def __init__(self, spec, sack):
+    def __init__(self, spec, sack, workers=None, registry=None):
         self.spec = spec
         self.sack = sack
         self.plugins = set()
+        self.workers = workers or os.cpu_count() or 1
+        self.registry = registry or PluginRegistry(
+            get_cache_dir() / "plugins.json")
+        self.profiler = HookProfiler()
 
     def execute_download(self, source, dest):
         logging.info("plugin 'download' phase executed")
-        for plugin in self.plugins:
-            if self.call_method(
-                    self.load_method(plugin, "download"), source, dest):
+        for plugin in self._order_plugins(self.plugins):
+            if self._call_hook(plugin, "download", source, dest):
                 return
 
     def execute_extraction(self, source, dest):
         """ Executes extraction of archive into destination directory """
         logging.info("plugin 'extraction' phase executed")
-        for plugin in self.plugins:
-            if self.call_method(self.load_method(
-                                plugin, "extraction"), source, dest):
+        for plugin in self._order_plugins(self.plugins):
+            if self._call_hook(plugin, "extraction", source, dest):
                 return
         raise RuntimeError("No plugin to extract '{}'!".format(source))
 
@@ -58,48 +65,144 @@ class PluginEngine:
             logging.warn("tried to execute non-valid phase %s" % phase)
             return
         logging.info("plugin phase %s executed" % phase)
-        for plugin in self.plugins:
-            self.call_method(
-                self.load_method(plugin, phase),
-                project_dir, self.spec, self.sack)
+        plugins = [plugin for plugin in self.plugins
+                   if callable(self.load_method(plugin, phase))]
+        order = self._order_plugins(plugins)
+        deps = self._phase_dependencies(phase, order)
+        with self.profiler.measure_phase(phase), \
+                FileIndex.activate(project_dir):
+            self._run_scheduled(phase, order, deps,
+                                project_dir, self.spec, self.sack)
+
+    def _run_scheduled(self, phase, order, deps, *args):
+        """ Runs hook of every plugin as soon as all plugins it depends on
+            are finished. Hooks are run in threads - plugins spend most of
+            the time in subprocesses or I/O and spec has to be shared. """
+        waiting = list(order)
+        running = {}
+        finished = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while waiting or running:
+                for plugin in [_p for _p in waiting
+                               if deps[_p] <= finished]:
+                    waiting.remove(plugin)
+                    running[executor.submit(
+                        self._call_hook, plugin, phase, *args)] = plugin
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished.add(running.pop(future))
+
+    @staticmethod
+    def plugin_name(plugin):
+        if isinstance(plugin, LazyPlugin):
+            return plugin.name
+        return plugin.__class__.__name__
+
+    def _order_plugins(self, plugins):
+        """ Sorts plugins topologically by their 'after' attribute,
+            independent plugins are sorted by name """
+        plugins = sorted(plugins, key=self.plugin_name)
+        names = [self.plugin_name(_p) for _p in plugins]
+        preds = [set(_i for _i, _n in enumerate(names) if _n in _p.after)
+                 for _p in plugins]
+        ready = []
+        for i, _preds in enumerate(preds):
+            if not _preds:
+                heappush(ready, i)
+        order = []
+        while ready:
+            i = heappop(ready)
+            order.append(plugins[i])
+            for other, _preds in enumerate(preds):
+                if i in _preds:
+                    _preds.remove(i)
+                    if not _preds:
+                        heappush(ready, other)
+        if len(order) != len(plugins):
+            cycle = [_i for _i, _preds in enumerate(preds) if _preds]
+            logging.warning("cycle in plugin dependencies: %s"
+                            % ", ".join(names[_i] for _i in cycle))
+            order += [plugins[_i] for _i in cycle]
+        return order
+
+    def _phase_dependencies(self, phase, order):
+        """ Returns dict plugin -> set of plugins that have to finish
+            before it. Plugin depends on all preceding plugins it is ordered
+            after or that access the same spec attributes. """
+        deps = {}
+        for i, plugin in enumerate(order):
+            deps[plugin] = set(
+                _p for _p in order[:i]
+                if self.plugin_name(_p) in plugin.after or
+                self._conflicts(phase, _p, plugin))
+        return deps
+
+    @staticmethod
+    def _spec_access(plugin, phase):
+        reads = getattr(plugin, "reads", None)
+        writes = getattr(plugin, "writes", None)
+        if not isinstance(writes, dict) or phase not in writes:
+            return None
+        reads = reads.get(phase, ()) if isinstance(reads, dict) else ()
+        return set(reads), set(writes[phase])
+
+    @staticmethod
+    def _conflicts(phase, first, second):
+        first = PluginEngine._spec_access(first, phase)
+        second = PluginEngine._spec_access(second, phase)
+        if first is None or second is None:
+            return True
+        return bool(first[1] & (second[0] | second[1]) or
+                    second[1] & first[0])
 
     def execute_mock_recover(self, log):
         """ Executes all mock_recoved methods that checkout returned log
             from mock build and parse it to find repairable errors. """
         _ret_code = False
-        for plugin in self.plugins:
-            _ret_code |= self.call_method(
-                self.load_method(plugin, "mock_recover"), log, self.spec)
+        for plugin in self._order_plugins(self.plugins):
+            _ret_code |= self._call_hook(
+                plugin, "mock_recover", log, self.spec)
         return _ret_code
 
+    def _call_hook(self, plugin, hook, *args):
+        """ Calls hook of plugin (if implemented) and records its
+            resource usage """
+        method = self.load_method(plugin, hook)
+        if not callable(method):
+            return False
+        access = self._spec_access(plugin, hook)
+        with self.profiler.measure(self.plugin_name(plugin), hook,
+                                   self.spec,
+                                   access[1] if access else None):
+            return self.call_method(method, *args)
+
+    def plugin_versions(self):
+        """ Returns sorted list of [module, plugin name, mtime of module]
+            of loaded plugins, mtime is 0 for plugins added as instances """
+        mtimes = self.registry.module_mtimes()
+        return sorted([getattr(_p, "module_name", type(_p).__module__),
+                       getattr(_p, "name", type(_p).__name__),
+                       mtimes.get(getattr(_p, "module_name", None), 0)]
+                      for _p in self.plugins)
+
     def load_plugins(self, path, excludes=[]):
-        """finds all plugins in dir and it's subdirectories"""
+        """finds all plugins in dir and it's subdirectories, plugin modules
+           are imported when one of their hooks is executed"""
 
-        pyfiles = path.rglob('*.py')
+        pyfiles = sorted(path.rglob('*.py'))
         for pyfile in pyfiles:
             splitted_path = self._os_path_split(str(pyfile)[:-3])
-            path_to_file = '.'.join(splitted_path[:-1])
-            imported_path = __import__(
-                path_to_file, fromlist=[splitted_path[-1]])
-            imported_file = getattr(imported_path, splitted_path[-1])
-            plugin_file = imported_file.__name__
-            for var_name in dir(imported_file):
-                attr = getattr(imported_file, var_name)
-                if inspect.isclass(attr) and attr != Plugin and \
-                   issubclass(attr, Plugin):
-                    try:
-                        plugin = attr()
-                        plugin_name = plugin.__class__.__name__
-                        if plugin_name not in excludes:
-                            self.plugins.add(plugin)
-                            logging.info("plugin %s loaded (%s)" %
-                                         (plugin_name, plugin_file))
-                        else:
-                            logging.info("plugin %s was excluded (%s)" %
-                                         (plugin_name, plugin_file))
-                    except Exception:
-                        logging.warn("plugin %s not loaded (%s)" %
-                                     (plugin_name, plugin_file))
+            plugin_file = '.'.join(splitted_path)
+            for record in self.registry.plugin_classes(plugin_file, pyfile):
+                plugin_name = record["name"]
+                if plugin_name not in excludes:
+                    self.plugins.add(LazyPlugin(plugin_file, record))
+                    logging.info("plugin %s loaded (%s)" %
+                                 (plugin_name, plugin_file))
+                else:
+                    logging.info("plugin %s was excluded (%s)" %
+                                 (plugin_name, plugin_file))
+        self.registry.save()
 
     @staticmethod
     def _os_path_split(path):
@@ -0,0 +1,123 @@
+from importlib import import_module
+from rpg.plugin import Plugin
+from rpg.utils import load_json_cache, save_json_cache
+from threading import Lock
+import inspect
+import logging
+import os
+
+
+class PluginRegistry:
+    """ Persisted registry of plugin classes, their modules and implemented
+        hooks. Entry of module is valid while its file has the same mtime,
+        so plugin modules don't have to be imported on every start.
+
+:Example:
+
+>>> from pathlib import Path
+>>> from rpg.plugin_registry import PluginRegistry
+>>> registry = PluginRegistry(Path("~/.cache/rpg/plugins.json"))
+>>> registry.plugin_classes("rpg.plugins.lang.c",
+                            Path("rpg/plugins/lang/c.py"))
+[{'name': 'CPlugin', 'hooks': ['mock_recover', 'patched'], ...}]
+>>> registry.save()
+"""
+
+    hooks = ("download", "extraction", "extracted", "patched", "compiled",
+             "installed", "package_build", "mock_recover")
+
+    def __init__(self, path=None):
+        self.path = path
+        self._modules = load_json_cache(path) if path else {}
+        self._changed = False
+
+    def plugin_classes(self, module_name, pyfile):
+        """ Returns list of records (dicts) describing plugin classes
+            of module, imports module only if its file was changed """
+        key = os.path.abspath(str(pyfile))
+        mtime = os.stat(key).st_mtime_ns
+        entry = self._modules.get(key)
+        if entry and entry["mtime"] == mtime and \
+                entry["module"] == module_name:
+            return entry["classes"]
+        logging.debug("plugin module %s changed, importing it" % module_name)
+        module = import_module(module_name)
+        classes = [self._describe(attr) for attr in
+                   [getattr(module, var_name) for var_name in dir(module)]
+                   if inspect.isclass(attr) and attr != Plugin and
+                   issubclass(attr, Plugin)]
+        self._modules[key] = {"mtime": mtime, "module": module_name,
+                              "classes": classes}
+        self._changed = True
+        return classes
+
+    def module_mtimes(self):
+        """ Returns dict module name -> mtime of its file """
+        return dict((_e["module"], _e["mtime"])
+                    for _e in self._modules.values())
+
+    def save(self):
+        if self.path and self._changed:
+            save_json_cache(self.path, self._modules)
+            self._changed = False
+
+    @classmethod
+    def _describe(cls, plugin_class):
+        return {
+            "name": plugin_class.__name__,
+            "hooks": sorted(hook for hook in cls.hooks
+                            if callable(getattr(plugin_class, hook, None))),
+            "after": list(plugin_class.after),
+            "reads": cls._accesses(plugin_class.reads),
+            "writes": cls._accesses(plugin_class.writes),
+        }
+
+    @staticmethod
+    def _accesses(accesses):
+        if accesses is None:
+            return None
+        return dict((hook, list(attrs)) for hook, attrs in accesses.items())
+
+
+class LazyPlugin:
+    """ Stands for plugin instance, module of the plugin is imported and
+        plugin is instantiated when one of its hooks is needed """
+
+    def __init__(self, module_name, record):
+        self.module_name = module_name
+        self.name = record["name"]
+        self.hooks = frozenset(record["hooks"])
+        self.after = tuple(record["after"])
+        self.reads = record["reads"]
+        self.writes = record["writes"]
+        self._instance = None
+        self._failed = False
+        self._lock = Lock()
+
+    @property
+    def instance(self):
+        """ Returns plugin instance or None if it couldn't be created """
+        with self._lock:
+            if self._instance is None and not self._failed:
+                try:
+                    module = import_module(self.module_name)
+                    self._instance = getattr(module, self.name)()
+                    logging.debug("plugin %s instantiated (%s)"
+                                  % (self.name, self.module_name))
+                except Exception:
+                    self._failed = True
+                    logging.warning("plugin %s not loaded (%s)"
+                                    % (self.name, self.module_name))
+            return self._instance
+
+    def __getattr__(self, name):
+        if name.startswith("_") or \
+                (name in PluginRegistry.hooks and name not in self.hooks):
+            raise AttributeError(name)
+        instance = self.instance
+        if instance is None:
+            raise AttributeError(name)
+        return getattr(instance, name)
+
+    def __repr__(self):
+        return "LazyPlugin(%s.%s)" % (self.module_name, self.name)
@@ -1,38 +1,89 @@
+from rpg import macros
 from rpg.plugin import Plugin
-from rpg.command import Command
-from modulefinder import ModuleFinder
+from rpg.file_index import FileIndex
+from rpg.import_scanner import ImportScanner
+from rpg.profiler import count_spawn, counted
+from rpg.utils import get_cache_dir
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import rpm
+import subprocess
 
 
 class PythonPlugin(Plugin):
 
+    writes = {"patched": ("required_files",),
+              "installed": ("files",)}
+
     def patched(self, project_dir, spec, sack):
         """ Find python dependencies """
-        for item in list(project_dir.glob('**/*.py')):
-            try:
-                mod = ModuleFinder()
-                mod.run_script(str(item))
-                for _, mod in mod.modules.items():
-                    if mod.__file__ and mod.__file__.startswith("/usr/lib"):
-                        spec.required_files.add(mod.__file__)
-            except ImportError as ie:
-                logging.warn("Exception was raised by ModuleFinder:\n" +
-                             str(ie) + "\nOn file: " + str(item))
+        sources = [_f.path for _f in
+                   FileIndex.get(project_dir).with_suffix('.py')]
+        if not sources:
+            return
+        local = set(_f.stem for _f in sources)
+        local.update(_f.parent.name for _f in sources
+                     if _f.name == "__init__.py")
+        scanner = ImportScanner(get_cache_dir() / "python_imports.json")
+        spec.required_files.update(
+            _f for _f in scanner.scan(sources, local)
+            if _f.startswith("/usr/lib"))
 
     def installed(self, project_dir, spec, sack):
         """ Compiles all python files depending on which python version they
             are and appends them into files macro """
-        python_version = ""
-        for py_file in list(project_dir.glob('**/*.py')):
-            if rpm.expandMacro("%{python_sitearch}") in str(py_file) or\
-                    rpm.expandMacro("%{python_sitelib}") in str(py_file):
-                python_version = "python2"
-            elif rpm.expandMacro("%{python3_sitearch}") in str(py_file) or\
-                    rpm.expandMacro("%{python3_sitelib}") in str(py_file):
-                python_version = "python3"
-            Command([python_version + ' ' + sw +
-                     ' -c \'import compileall; compileall.compile_file("' +
-                     str(py_file) + '")\'' for sw in ["-O", ""]]).execute()
-        spec.files.update([("/" + str(_f.relative_to(project_dir)), None, None)
-                           for _f in project_dir.glob('**/*.py*')])
+        index = FileIndex.get(project_dir)
+        groups = self._group_by_version(
+            [str(_f.path) for _f in index.with_suffix('.py')])
+        jobs = [(python, opt, files)
+                for python, files in sorted(groups.items())
+                for opt in self.OPTIMIZATIONS]
+        if jobs:
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                list(executor.map(counted(lambda job: self._compile(*job)),
+                                  jobs))
+        index.refresh()
+        spec.files.update([("/" + str(_f.path.relative_to(project_dir)),
+                            None, None)
+                           for _f in index.match('*.py*')])
+
+    OPTIMIZATIONS = (["-O"], [])
+
+    SITE_DIRS = (("python2", ("%{python_sitearch}", "%{python_sitelib}")),
+                 ("python3", ("%{python3_sitearch}", "%{python3_sitelib}")))
+
+    @classmethod
+    def _group_by_version(cls, py_files):
+        """ Returns dict interpreter -> files installed into its site
+            directories, files outside of them are compiled by python3 """
+        site_dirs = [(python, macros.expand_all(_macros))
+                     for python, _macros in cls.SITE_DIRS]
+        groups = {}
+        for py_file in py_files:
+            python = next((_python for _python, _dirs in site_dirs
+                           if any(_dir in py_file for _dir in _dirs)),
+                          "python3")
+            groups.setdefault(python, []).append(py_file)
+        return groups
+
+    @staticmethod
+    def _compile(python, optimization, files):
+        """ Compiles files by one interpreter process, python3 compiles
+            them on all cores """
+        args = [python] + optimization + ["-m", "compileall", "-q"]
+        if python == "python3":
+            args += ["-j", "0"]
+        args += ["-i", "-"]
+        logging.debug("compiling %d files: %s" % (len(files), " ".join(args)))
+        count_spawn()
+        try:
+            proc = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+        except OSError as err:
+            logging.warning("%s can't be executed: %s" % (python, str(err)))
+            return
+        output = proc.communicate("\n".join(files).encode(
+            "utf-8", "surrogateescape"))[0]
+        if proc.returncode:
+            logging.warning(" ".join(args) + "\n" +
+                            output.decode("utf-8", "replace"))
@@ -1,42 +1,36 @@
 import logging
 from rpg.plugin import Plugin
+from rpg.sack_index import SackIndex
 
 
 class FilesToPkgsPlugin(Plugin):
 
-    _TRANSLATED = {}
-    _IGNORE = []
+    reads = {"installed": ("required_files", "build_required_files",
+                           "check")}
+    writes = {"installed": ("Requires", "BuildRequires",
+                            "required_files", "build_required_files")}
+
+    _IGNORE = set()
 
     def installed(self, project_dir, spec, sack):
         """ Translates (build_)required_files into (Build)Requires macros
             with DNF sack """
-        def _resolve(files, query):
-            for _file in files:
-                try:
-                    if _file in self._IGNORE:
-                        continue
-                    elif _file in self._TRANSLATED:
-                        yield self._TRANSLATED[_file]
-                    else:
-                        pckg = query.filter(file__glob=_file)[0]
-                        self._TRANSLATED[_file] = pckg.name
-                        for _f in pckg.files:
-                            self._TRANSLATED[_f] = pckg.name
-                        yield pckg.name
-                except IndexError:
-                    self._IGNORE.append(_file)
-                    logging.log(logging.WARN,
-                                "For '{}' have not been found any package"
-                                .format(_file))
+        def _resolve(files, index):
+            translated = index.resolve(files)
+            for _file in set(files) - set(translated) - self._IGNORE:
+                self._IGNORE.add(_file)
+                logging.log(logging.WARN,
+                            "For '{}' have not been found any package"
+                            .format(_file))
+            return set(translated.values())
 
         if sack:
-            _query = sack.query().available()
+            _index = SackIndex.get(sack)
             logging.info("Resolving Requires")
-            spec.Requires.update(
-                set(_resolve(spec.required_files, _query)))
+            spec.Requires.update(_resolve(spec.required_files, _index))
             logging.info("Resolving BuildRequires")
             spec.BuildRequires.update(
-                set(_resolve(spec.build_required_files, _query)))
+                _resolve(spec.build_required_files, _index))
             spec.required_files = set()
             spec.build_required_files = set()
             if str(spec.check):
@@ -1,12 +1,16 @@
+from rpg.file_index import FileIndex
 from rpg.plugin import Plugin
 
 
 class FindFilePlugin(Plugin):
 
+    # python plugin creates bytecode in installed directory
+    after = ("PythonPlugin",)
+    writes = {"installed": ("files",)}
+
     def installed(self, project_dir, spec, sack):
         """ Finds files that will be installed and
             appends them to files macro """
-        for item in list(project_dir.glob('**/*')):
-            if item.is_file():
-                spec.files.add(("/" + str(item.relative_to(project_dir)),
-                                None, None))
+        for item in FileIndex.get(project_dir).files():
+            spec.files.add(("/" + str(item.path.relative_to(project_dir)),
+                            None, None))
@@ -1,14 +1,16 @@
+from rpg.file_index import FileIndex
 from rpg.plugin import Plugin
 
 
 class FindLibraryPlugin(Plugin):
 
+    writes = {"installed": ("post", "postun")}
+
     def installed(self, project_dir, spec, sack):
         """ Appends ldconfig if any type of library is installed """
-        dyn_libs = list(project_dir.glob('**/lib*.so*'))
-        static_libs = list(project_dir.glob('**/lib*.a*'))
-        if ((dyn_libs and dyn_libs[0].is_file()) or
-                static_libs and static_libs[0].is_file()):
+        index = FileIndex.get(project_dir)
+        if any(lib.is_file for lib in
+               index.match('lib*.so*') + index.match('lib*.a*')):
 
             # FIXME when Command is integrated with Spec
             spec.post.append("/sbin/ldconfig")
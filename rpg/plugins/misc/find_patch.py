@@ -1,19 +1,18 @@
+from rpg.content_type import content_types, PATCH
+from rpg.file_index import FileIndex
 from rpg.plugin import Plugin
-import subprocess
 
 
 class FindPatchPlugin(Plugin):
 
+    writes = {"extracted": ("Patch",)}
+
     def extracted(self, project_dir, spec, sack):
-        patches = [(f, f.stat().st_mtime) for f in project_dir.iterdir()
-                   if _is_patch(f)]
+        entries = [f for f in FileIndex.get(project_dir).top_level()
+                   if not f.is_dir]
+        types = content_types(f.path for f in entries)
+        patches = [(f.path, f.path.stat().st_mtime) for f in entries
+                   if types[f.path] == PATCH]
         patches_by_modification = sorted(patches, key=lambda m: m[1])
         spec.Patch = list(
             map(lambda p: str(p[0]), patches_by_modification))
-
-
-def _is_patch(path):
-    if path.is_dir():
-        return False
-    output = subprocess.check_output(["file", str(path), "-b"])
-    return output.decode().find("unified diff output") != -1
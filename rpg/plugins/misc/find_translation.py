@@ -1,10 +1,17 @@
+from rpg.content_type import content_types, GETTEXT
+from rpg.file_index import FileIndex
 from rpg.plugin import Plugin
 
 
 class FindTranslationPlugin(Plugin):
 
+    writes = {"installed": ("files",)}
+
     def installed(self, project_dir, spec, sack):
-        translation_file = list(project_dir.glob('**/*.mo'))
-        if translation_file and translation_file[0].is_file():
+        candidates = FileIndex.get(project_dir).with_suffix('.mo')
+        types = content_types(f.path for f in candidates)
+        translation_file = [f for f in candidates
+                            if types[f.path] == GETTEXT]
+        if translation_file:
             spec.files.add((("-f %%{%s}.lang"
                              % translation_file[0].name), None, None))
@@ -1,4 +1,5 @@
 from rpg.command import Command
+from rpg.file_index import FileIndex
 from rpg.plugin import Plugin
 from rpg.utils import str_to_pkgname
 import logging
@@ -7,6 +8,12 @@ import re
 
 class AutotoolsPlugin(Plugin):
 
+    # overrides build and install scripts of generic Makefile
+    after = ("MakePlugin",)
+    writes = {"extracted": ("Name", "Version"),
+              "patched": ("BuildRequires", "build", "install"),
+              "compiled": ("build_required_files",)}
+
     re_CHECK_MODULES = re.compile(
         r"PKG_CHECK_MODULES\s*\(.*?,\s*(.*?)\s*?[,\)]", re.DOTALL)
 
@@ -62,7 +69,8 @@ class AutotoolsPlugin(Plugin):
         if config_log.is_file():
             spec.build_required_files.update(_extract_log_deps(
                 self.re_CHECK_PROGS, config_log.open()))
-        for deps in list(project_dir.glob("**/*.Po")):
+        for deps in [_f.path for _f in
+                     FileIndex.get(project_dir).with_suffix(".Po")]:
             with deps.open() as d:
                 spec.build_required_files.update(
                     _extract_dependencies(
@@ -1,23 +1,35 @@
 from rpg.command import Command
+from rpg.file_index import FileIndex
 from rpg.plugin import Plugin
+from rpg.sack_index import SackIndex
 from rpg.utils import str_to_pkgname
 import logging
 import re
 
+_COMMAND = re.compile(r"([A-Za-z_]\w*)\s*\(")
+_NAME_TAIL = re.compile(r"[A-Za-z_]\w*\s*$")
+_BARE_TESTING = re.compile(r"\bENABLE_TESTING\b(?!\s*\()", re.IGNORECASE)
+_FILEPATH = re.compile(r":FILEPATH=(/\S*)")
+_VERSION = re.compile(r"\d")
+
 
 class CMakePlugin(Plugin):
 
+    # overrides build and install scripts of generic Makefile
+    after = ("MakePlugin",)
+    writes = {"extracted": ("Name", "Version"),
+              "patched": ("BuildRequires", "build", "install", "check"),
+              "compiled": ("build_required_files", "required_files")}
+
     def extracted(self, project_dir, spec, sack):
         if (project_dir / "CMakeLists.txt").is_file():
-            regex = re.compile(
-                r"project\s*\((.*?)(?:\s(.*?))?[\s\)]",
-                re.IGNORECASE | re.DOTALL)
-            with (project_dir / "CMakeLists.txt").open() as f:
-                result = regex.search(f.read())
-                if result.group(1):
-                    spec.Name = str_to_pkgname(result.group(1))
-                if result.group(2):
-                    spec.Version = result.group(2)
+            for name, args in _commands(project_dir / "CMakeLists.txt"):
+                if name == "project" and args:
+                    spec.Name = str_to_pkgname(args[0])
+                    version = _project_version(args)
+                    if version:
+                        spec.Version = version
+                    break
 
     def patched(self, project_dir, spec, sack):
         """ Appends commands to build Project with CMake build system """
@@ -28,32 +40,105 @@ class CMakePlugin(Plugin):
             build.append("cmake .")
             build.append("%{make_build}")
             install = Command('make install DESTDIR="$RPM_BUILD_ROOT"')
-            _parse(project_dir, spec)
+            _parse(project_dir, spec, sack)
             spec.build = build
             spec.install = install
 
     def compiled(self, project_dir, spec, sack):
         """ Finds (not only for build) dependencies from CMakeCache """
-        regex = re.compile(r":FILEPATH=(/\S*)")
-        cache_files = list(project_dir.glob("**/CMakeCache.txt"))
-        matches = []
-        for p in cache_files:
-            with p.open() as f:
-                matches += regex.findall(f.read())
-        matches = set(matches)
+        cache_files = FileIndex.get(project_dir).named("CMakeCache.txt")
+        matches = set()
+        for p in [_f.path for _f in cache_files if _f.is_file]:
+            with p.open(errors="replace") as f:
+                for line in f:
+                    match = _FILEPATH.search(line)
+                    if match:
+                        matches.add(match.group(1))
         spec.build_required_files.update(matches)
         spec.required_files.update(matches)
 
 
-def _parse(project_dir, spec):
-    regex = re.compile(r"\#(?!\[\[)[^\n]*ENABLE_TESTING.*?(?:\n|$)|"
-                       r"\#\[\[.*?ENABLE_TESTING.*?\]\]|"
-                       r"ENABLE_TESTING", re.DOTALL)
-    cmake_files = list(project_dir.glob("**/CMakeLists.txt"))
-    matches = []
-    for element in cmake_files:
-        with element.open() as f:
-            matches += regex.findall(f.read())
-            if "ENABLE_TESTING" in matches:
-                spec.check.append("make test ARGS='-V %{?_smp_mflags}'")
-                return
+def _parse(project_dir, spec, sack):
+    """ Enables tests if any CMakeLists.txt calls ENABLE_TESTING and adds
+        'cmake(Package)' BuildRequires for find_package calls that are
+        provided by some package in sack """
+    cmake_files = FileIndex.get(project_dir).named("CMakeLists.txt")
+    testing = False
+    packages = set()
+    for element in [_f.path for _f in cmake_files if _f.is_file]:
+        for name, args in _commands(element):
+            if name == "enable_testing":
+                testing = True
+            elif name == "find_package" and args:
+                packages.add(args[0])
+    if testing:
+        spec.check.append("make test ARGS='-V %{?_smp_mflags}'")
+    if sack and packages:
+        index = SackIndex.get(sack)
+        for package in sorted(packages):
+            for provide in ("cmake(%s)" % package,
+                            "cmake(%s)" % package.lower()):
+                if index.is_provided(provide):
+                    spec.BuildRequires.add(provide)
+                    break
+
+
+def _project_version(args):
+    """ Returns version from arguments of project command """
+    if "VERSION" in args[1:-1]:
+        return args[args.index("VERSION", 1) + 1]
+    if len(args) > 1 and _VERSION.match(args[1]):
+        return args[1]
+    return None
+
+
+def _commands(path):
+    """ Yields (lower case name, arguments) of CMake commands in file,
+        file is read line by line and comments are skipped. ENABLE_TESTING
+        is accepted even without parentheses. """
+    text = ""
+    in_comment = False
+    with path.open(errors="replace") as f:
+        for line in f:
+            line, in_comment = _strip_comments(line, in_comment)
+            if _BARE_TESTING.search(line):
+                yield ("enable_testing", [])
+            text += line
+            while True:
+                command = _COMMAND.search(text)
+                if not command:
+                    # name of command may continue on next line
+                    tail = _NAME_TAIL.search(text)
+                    text = tail.group(0) if tail else ""
+                    break
+                end = text.find(")", command.end())
+                if end == -1:
+                    text = text[command.start():]
+                    break
+                yield (command.group(1).lower(),
+                       [_a.strip('"') for _a in
+                        text[command.end():end].split()])
+                text = text[end + 1:]
+
+
+def _strip_comments(line, in_comment):
+    """ Removes line and bracket (#[[ ]]) comments from line, returns
+        the rest of line and whether bracket comment continues """
+    result = ""
+    while line:
+        if in_comment:
+            end = line.find("]]")
+            if end == -1:
+                return result, True
+            line = line[end + 2:]
+            in_comment = False
+        start = line.find("#")
+        if start == -1:
+            return result + line, False
+        result += line[:start] + " "
+        if line.startswith("#[[", start):
+            line = line[start + 3:]
+            in_comment = True
+        else:
+            return result + "\n", False
+    return result, in_comment
@@ -5,6 +5,8 @@ import logging
 
 class MakePlugin(Plugin):
 
+    writes = {"patched": ("BuildRequires", "build", "install")}
+
     def patched(self, project_dir, spec, sack):
         """ Appends commands to build Project using Makefile build system """
         if (project_dir / "Makefile").is_file() or\
@@ -1,18 +1,20 @@
 from rpg.command import Command
 from rpg.plugin import Plugin
 from rpg.utils import str_to_pkgname
-from javapackages.maven.artifact import Artifact
-from javapackages.maven.artifact import ArtifactFormatException
-from javapackages.maven.artifact import ArtifactValidationException
-from lxml import etree
 import logging
 import re
 
 
 class MavenPlugin(Plugin):
 
+    reads = {"patched": ("Name",)}
+    writes = {"extracted": ("Name", "Version", "description", "URL"),
+              "patched": ("BuildRequires", "build", "install"),
+              "compiled": ("BuildRequires",)}
+
     def extracted(self, project_dir, spec, sack):
         if (project_dir / "pom.xml").is_file():
+            from lxml import etree
             et = etree.parse(str(project_dir / "pom.xml")).getroot()
             for branch in et:
                 tag = re.sub(r'^{.*?}', '', str(branch.tag))
@@ -49,6 +51,13 @@ class MavenPlugin(Plugin):
         """ After generation of dependencies (build) parses builddep file
             and creates Maven project build dependencies """
         if(project_dir / ".xmvn-builddep").is_file():
+            # imported only for maven projects, lxml and javapackages
+            # are slow to import
+            from javapackages.maven.artifact import Artifact
+            from javapackages.maven.artifact import ArtifactFormatException
+            from javapackages.maven.artifact import \
+                ArtifactValidationException
+            from lxml import etree
             try:
                 et = etree.parse(str(project_dir / ".xmvn-builddep")).getroot()
                 deps = et.findall('./dependency')
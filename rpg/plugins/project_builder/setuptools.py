@@ -7,6 +7,10 @@ import re
 
 class SetuptoolsPlugin(Plugin):
 
+    writes = {"extracted": ("Name", "Version", "description", "License",
+                            "URL"),
+              "patched": ("BuildRequires", "build", "install")}
+
     def extracted(self, project_dir, spec, sack):
         if (project_dir / "setup.py").is_file():
             with (project_dir / "setup.py").open() as f:
@@ -1,30 +1,36 @@
 from rpg.plugin import Plugin
-from re import search
+from re import compile
 
 
 class BashCommandPlugin(Plugin):
 
-    _file = ""
+    def __init__(self):
+        # missing commands already added by previous recover iterations
+        self._attempted = set()
+
+    _COMMAND_NOT_FOUND = compile(
+        r"\s*([^:]+)\:\s*" +
+        r"[cC][oO][mM][mM][aA][nN][dD]\s*[nN][oO][tT]\s*" +
+        r"[fF][oO][uU][nN][dD]")
 
     def mock_recover(self, log, spec):
         """ Parses mock logs and finds missing executables, append them
             into build_required_files (to be translated into packages)
             Returns True on any change"""
+        missing = set()
         for err in log:
-            match = search(
-                r"\s*([^:]+)\:\s*" +
-                r"[cC][oO][mM][mM][aA][nN][dD]\s*[nN][oO][tT]\s*" +
-                r"[fF][oO][uU][nN][dD]", err)
+            match = self._COMMAND_NOT_FOUND.search(err)
             if match:
-                if match.group(1) == self._file or\
-                        "/usr/bin/" + match.group(1) == self._file:
-                    raise RuntimeError("Couldn't resolve '{}'!"
-                                       .format(match.group(1)))
+                if "/" in match.group(1):
+                    missing.add(match.group(1))
                 else:
-                    if "/" in match.group(1):
-                        self._file = match.group(1)
-                    else:
-                        self._file = "/usr/bin/" + match.group(1)
-                spec.build_required_files.add(self._file)
-                return True
-        return False
+                    missing.add("/usr/bin/" + match.group(1))
+        if not missing:
+            return False
+        new = missing - self._attempted
+        if not new:
+            raise RuntimeError("Couldn't resolve '{}'!"
+                               .format("', '".join(sorted(missing))))
+        spec.build_required_files.update(new)
+        self._attempted.update(new)
+        return True
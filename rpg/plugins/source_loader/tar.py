@@ -1,16 +1,103 @@
 from rpg.plugin import Plugin
+from rpg.utils import archive_member_parts, is_inside
+from copy import copy
+from pathlib import Path
 from tarfile import is_tarfile
-from rpg.utils import path_to_str
-from rpg.command import Command
+import logging
+import os
+import tarfile
+import tempfile
+
+#: tarfile can check members itself (python 3.12 and security backports)
+_DATA_FILTER = hasattr(tarfile, "data_filter")
 
 
 class TarPlugin(Plugin):
 
     def extraction(self, source, dest):
-        source = path_to_str(source)
-        if is_tarfile(source):
-            Command("tar xf {} -C {}".format(
-                    source, path_to_str(dest))).execute()
-            return True
-        else:
+        """ Extracts tarball into dest in one streaming pass, single top
+            level directory is stripped while members are written """
+        if not is_tarfile(str(source)):
             return False
+        with tarfile.open(str(source), "r|*") as tar:
+            _extract(tar, Path(dest))
+        return True
+
+
+def _extract(tar, dest):
+    """ Extracts members in stream, attributes of directories are set at
+        the end (like GNU tar does), so read-only directories can be
+        filled """
+    prefix = None
+    stripping = True
+    directories = []
+    root = os.path.realpath(str(dest))
+    for member in tar:
+        parts = archive_member_parts(member.name)
+        if parts is None:
+            logging.warning("skipping unsafe tar member '{}'"
+                            .format(member.name))
+            continue
+        if not parts:
+            continue
+        if stripping and prefix is None:
+            if len(parts) > 1 or member.isdir():
+                prefix = parts[0]
+            else:
+                stripping = False
+        if stripping and (parts[0] != prefix or
+                          (len(parts) == 1 and not member.isdir())):
+            # archive has more top level entries, put back what was
+            # already extracted into its own directory
+            _unstrip(dest, prefix)
+            directories = [(prefix + "/" + _name, _member)
+                           for _name, _member in directories]
+            stripping = False
+        if stripping:
+            if len(parts) == 1:
+                continue
+            parts = parts[1:]
+            if member.islnk():
+                link_parts = archive_member_parts(member.linkname) or []
+                member.linkname = "/".join(link_parts[1:])
+        member.name = "/".join(parts)
+        if not _is_safe(root, member):
+            logging.warning("skipping tar member '{}' that points outside "
+                            "of destination".format(member.name))
+            continue
+        if member.isdir():
+            directories.append((member.name, member))
+            member = copy(member)
+            member.mode = 0o700
+        if _DATA_FILTER:
+            tar.extract(member, str(dest), filter="data")
+        else:
+            tar.extract(member, str(dest))
+    for name, member in sorted(directories, reverse=True):
+        path = str(dest / name)
+        os.chmod(path, member.mode & 0o777)
+        os.utime(path, (member.mtime, member.mtime))
+
+
+def _is_safe(root, member):
+    """ Returns False if member would be written through already extracted
+        symlink or link would point outside of root """
+    path = os.path.realpath(os.path.join(root, member.name))
+    if not is_inside(root, path):
+        return False
+    if member.issym():
+        return not os.path.isabs(member.linkname) and is_inside(
+            root, os.path.realpath(os.path.join(os.path.dirname(path),
+                                                member.linkname)))
+    if member.islnk():
+        return is_inside(root, os.path.realpath(
+            os.path.join(root, member.linkname)))
+    return True
+
+
+def _unstrip(dest, prefix):
+    temp = Path(tempfile.mkdtemp(dir=str(dest)))
+    for entry in dest.iterdir():
+        if entry != temp:
+            os.rename(str(entry), str(temp / entry.name))
+    os.rename(str(temp), str(dest / prefix))
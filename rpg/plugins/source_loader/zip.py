@@ -1,16 +1,88 @@
 from rpg.plugin import Plugin
-from zipfile import is_zipfile
-from rpg.utils import path_to_str
-from rpg.command import Command
+from rpg.utils import archive_member_parts, is_inside
+from pathlib import Path
+from shutil import copyfileobj
+from zipfile import ZipFile, is_zipfile
+import logging
+import os
+import stat
+import time
 
 
 class ZipPlugin(Plugin):
 
     def extraction(self, source, dest):
-        source = path_to_str(source)
-        if is_zipfile(source):
-            Command("unzip {} -d {}".format(
-                    source, path_to_str(dest))).execute()
-            return True
-        else:
+        """ Extracts zip archive into dest, single top level directory
+            is stripped while members are written """
+        if not is_zipfile(str(source)):
             return False
+        dest = Path(dest)
+        with ZipFile(str(source)) as archive:
+            members = []
+            for info in archive.infolist():
+                parts = archive_member_parts(info.filename)
+                if parts is None:
+                    logging.warning("skipping unsafe zip member '{}'"
+                                    .format(info.filename))
+                elif parts:
+                    members.append((info, parts))
+            strip = _common_prefix(members)
+            root = os.path.realpath(str(dest))
+            for info, parts in members:
+                if len(parts) <= strip:
+                    continue
+                target = dest.joinpath(*parts[strip:])
+                if not _is_safe(archive, info, root, target):
+                    logging.warning("skipping unsafe zip member '{}'"
+                                    .format(info.filename))
+                    continue
+                _extract(archive, info, target)
+        return True
+
+
+def _common_prefix(members):
+    """ Returns 1 if all members are inside single top level directory """
+    if not members:
+        return 0
+    top = members[0][1][0]
+    for info, parts in members:
+        if parts[0] != top or (len(parts) == 1 and not _is_dir(info)):
+            return 0
+    return 1
+
+
+def _is_safe(archive, info, root, target):
+    """ Returns False if member would be written through already extracted
+        symlink or link would point outside of root """
+    path = os.path.realpath(str(target))
+    if not is_inside(root, path):
+        return False
+    if stat.S_ISLNK(info.external_attr >> 16):
+        link = archive.read(info).decode("utf-8")
+        return not os.path.isabs(link) and is_inside(
+            root, os.path.realpath(os.path.join(os.path.dirname(path),
+                                                link)))
+    return True
+
+
+def _is_dir(info):
+    return info.filename.endswith("/")
+
+
+def _extract(archive, info, target):
+    mode = info.external_attr >> 16
+    if _is_dir(info):
+        if not target.is_dir():
+            target.mkdir(parents=True)
+        return
+    if not target.parent.is_dir():
+        target.parent.mkdir(parents=True)
+    if stat.S_ISLNK(mode):
+        os.symlink(archive.read(info).decode("utf-8"), str(target))
+        return
+    with archive.open(info) as src, target.open("wb") as dst:
+        copyfileobj(src, dst, 1 << 20)
+    if mode:
+        os.chmod(str(target), stat.S_IMODE(mode))
+    mtime = time.mktime(info.date_time + (0, 0, -1))
+    os.utime(str(target), (mtime, mtime))
@@ -0,0 +1,192 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock, local
+import json
+import resource
+import time
+
+_counter = local()
+_total = [0]
+_total_lock = Lock()
+
+
+def count_spawn():
+    """ Has to be called whenever rpg spawns a subprocess """
+    cell = _cell()
+    with _total_lock:
+        cell[0] += 1
+        _total[0] += 1
+
+
+def spawned_in_thread():
+    """ Returns number of subprocesses spawned by current thread and by
+        helper threads running functions wrapped by counted """
+    cell = _cell()
+    with _total_lock:
+        return cell[0]
+
+
+def counted(function):
+    """ Wraps function that is run in helper thread (e.g. in thread pool),
+        subprocesses it spawns are counted to the thread that wrapped it """
+    cell = _cell()
+
+    def wrapper(*args, **kwargs):
+        previous = getattr(_counter, "cell", None)
+        _counter.cell = cell
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _counter.cell = previous
+    return wrapper
+
+
+def _cell():
+    cell = getattr(_counter, "cell", None)
+    if cell is None:
+        cell = _counter.cell = [0]
+    return cell
+
+
+def spawned_total():
+    """ Returns number of subprocesses spawned by rpg """
+    return _total[0]
+
+
+try:
+    _thread_time = time.thread_time
+except AttributeError:
+    _thread_time = time.process_time
+
+
+def _peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class HookProfiler:
+    """ Records wall time, CPU time, peak RSS growth, number of spawned
+        subprocesses and changed spec attributes of every plugin hook call.
+        CPU time of the hook is time of its thread, CPU time of
+        subprocesses is taken from all children of rpg that finished during
+        the hook. Peak RSS is process-wide, so both children CPU time and
+        RSS growth may be charged to any hook running at the same time.
+
+:Example:
+
+>>> from rpg.profiler import HookProfiler
+>>> profiler = HookProfiler()
+>>> with profiler.measure("CPlugin", "patched", spec):
+        plugin.patched(project_dir, spec, sack)
+>>> profiler.write_report(Path("/var/tmp/rpg/profile.json"))
+>>> logging.info(profiler.summary())
+"""
+
+    def __init__(self):
+        self.hooks = []
+        self.phases = []
+        self._lock = Lock()
+
+    @contextmanager
+    def measure(self, plugin, hook, spec, fields=None):
+        """ Measures body of with block. Only fields (spec attribute names)
+            are checked for changes if they are given. """
+        before = _snapshot(spec, fields)
+        wall = time.perf_counter()
+        cpu = _thread_time()
+        children_cpu = _children_cpu()
+        rss = _peak_rss()
+        spawned = spawned_in_thread()
+        try:
+            yield
+        finally:
+            after = _snapshot(spec, fields)
+            record = OrderedDict([
+                ("plugin", plugin),
+                ("hook", hook),
+                ("wall", time.perf_counter() - wall),
+                ("cpu", _thread_time() - cpu),
+                ("children_cpu", _children_cpu() - children_cpu),
+                ("rss_delta", _peak_rss() - rss),
+                ("subprocesses", spawned_in_thread() - spawned),
+                ("changed", sorted(name for name in after
+                                   if before.get(name) != after[name])),
+            ])
+            with self._lock:
+                self.hooks.append(record)
+
+    @contextmanager
+    def measure_phase(self, phase):
+        wall = time.perf_counter()
+        spawned = spawned_total()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append(OrderedDict([
+                    ("phase", phase),
+                    ("wall", time.perf_counter() - wall),
+                    ("subprocesses", spawned_total() - spawned),
+                ]))
+
+    def report(self):
+        """ Returns structured report that can be serialized to JSON """
+        with self._lock:
+            return OrderedDict([
+                ("phases", list(self.phases)),
+                ("hooks", list(self.hooks)),
+                ("subprocesses", spawned_total()),
+            ])
+
+    def write_report(self, path):
+        with open(str(path), "w") as report:
+            json.dump(self.report(), report, indent=2)
+
+    def summary(self):
+        """ Returns table with totals of every plugin hook, the slowest
+            first """
+        totals = OrderedDict()
+        for record in self.report()["hooks"]:
+            key = (record["plugin"], record["hook"])
+            total = totals.setdefault(key,
+                                      [0, 0.0, 0.0, 0.0, 0, 0, set()])
+            total[0] += 1
+            total[1] += record["wall"]
+            total[2] += record["cpu"]
+            total[3] += record["children_cpu"]
+            total[4] = max(total[4], record["rss_delta"])
+            total[5] += record["subprocesses"]
+            total[6].update(record["changed"])
+        lines = ["%-24s %-14s %5s %9s %9s %9s %9s %6s  %s" % (
+            "plugin", "hook", "calls", "wall[s]", "cpu[s]", "child[s]",
+            "rss[KiB]", "procs", "changed")]
+        for (plugin, hook), total in sorted(totals.items(),
+                                            key=lambda _t: -_t[1][1]):
+            lines.append("%-24s %-14s %5d %9.3f %9.3f %9.3f %9d %6d  %s" % (
+                plugin, hook, total[0], total[1], total[2], total[3],
+                total[4], total[5], ", ".join(sorted(total[6]))))
+        return "\n".join(lines)
+
+
+def _snapshot(spec, fields):
+    if spec is None:
+        return {}
+    if fields is None:
+        fields = vars(spec).keys()
+    return dict((name, _freeze(getattr(spec, name, None)))
+                for name in fields)
+
+
+def _freeze(value):
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, (str, int, float, type(None))):
+        return value
+    # Command and other objects without value comparison
+    return str(value)
@@ -1,4 +1,5 @@
-from shutil import copytree, rmtree
+from rpg.workspace import clone_tree
+from shutil import rmtree
 import logging
 
 
@@ -23,8 +24,8 @@ class ProjectBuilder:
                                              str(build_command)))
         project_source_dir = str(project_source_dir)
 
-        rmtree(str(project_target_dir))
-        copytree(project_source_dir, str(project_target_dir))
+        rmtree(str(project_target_dir), True)
+        clone_tree(project_source_dir, project_target_dir)
 
         build_command.execute(project_target_dir)
 
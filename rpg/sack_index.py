@@ -0,0 +1,274 @@
+from bisect import bisect_left
+from itertools import islice
+from threading import Lock
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+_GLOB_CHARS = frozenset("*?[")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS repos (repo TEXT PRIMARY KEY, checksum TEXT)",
+    "CREATE TABLE IF NOT EXISTS packages (name TEXT, license TEXT, "
+    "repo TEXT)",
+    "CREATE TABLE IF NOT EXISTS provides (provide TEXT, repo TEXT)",
+    "CREATE TABLE IF NOT EXISTS files (path TEXT, rpath TEXT, pkg TEXT, "
+    "repo TEXT)",
+)
+
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS files_path ON files (path)",
+    "CREATE INDEX IF NOT EXISTS files_rpath ON files (rpath)",
+    "CREATE INDEX IF NOT EXISTS provides_provide ON provides (provide)",
+)
+
+
+class SackIndex:
+    """ Index of data rpg needs from DNF sack - names, provides, licenses
+        and file lists of all available packages. Files are looked up in
+        indexed columns, exact paths and '*suffix' globs (e.g. '*/stdio.h')
+        don't scan whole table. Results, even negative ones, are remembered.
+        Index is kept in memory or in sqlite file where it is stored per
+        repository together with checksum of repository metadata.
+
+:Example:
+
+>>> from rpg.sack_index import SackIndex
+>>> index = SackIndex.get(sack)
+>>> index.resolve(["/usr/include/stdio.h", "*zlib.h", "/nonexistent"])
+{'/usr/include/stdio.h': 'glibc-headers', '*zlib.h': 'zlib-devel'}
+>>> index.complete("dependencies", "python3-d", limit=3)
+['python3-dnf', 'python3-docs', 'python3-dbus']
+"""
+
+    _last = (None, None)
+    _last_lock = Lock()
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA mmap_size = 268435456")
+        self._lock = Lock()
+        self._resolved = {}
+        self._missing = set()
+        self._sorted = {}
+        self._by_length = {}
+        with self._db:
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+
+    def reopen(self):
+        """ Opens new connection to index file, must be called in forked
+            process before the index is used """
+        self._lock = Lock()
+        if str(self.path) != ":memory:":
+            self._db = sqlite3.connect(str(self.path),
+                                       check_same_thread=False)
+            self._db.execute("PRAGMA mmap_size = 268435456")
+
+    @classmethod
+    def get(cls, sack):
+        """ Returns index of sack, index is built only on first call with
+            the same sack """
+        if isinstance(sack, CachedSack):
+            return sack.index
+        with cls._last_lock:
+            last_sack, index = cls._last
+            if last_sack is not sack:
+                logging.info("Indexing available packages")
+                index = cls()
+                index.add_packages(sack.query().available())
+                cls._last = (sack, index)
+            return index
+
+    def add_packages(self, packages, repo=""):
+        packages = list(packages)
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO packages VALUES (?, ?, ?)",
+                ((pkg.name, pkg.license, repo) for pkg in packages))
+            self._db.executemany(
+                "INSERT INTO provides VALUES (?, ?)",
+                ((str(_p), repo) for pkg in packages for _p in pkg.provides))
+            self._db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?)",
+                ((_f, _f[::-1], pkg.name, repo)
+                 for pkg in packages for _f in pkg.files))
+            for statement in _INDEXES:
+                self._db.execute(statement)
+            self._forget()
+
+    def _forget(self):
+        self._resolved.clear()
+        self._missing.clear()
+        self._sorted.clear()
+        self._by_length.clear()
+
+    def repo_checksums(self):
+        """ Returns dict repo id -> checksum of its metadata """
+        with self._lock:
+            return dict(self._db.execute("SELECT repo, checksum FROM repos"))
+
+    def update_repo(self, repo, checksum, packages):
+        """ Replaces packages of repo """
+        self.remove_repo(repo)
+        self.add_packages(packages, repo)
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO repos VALUES (?, ?)",
+                             (repo, checksum))
+
+    def remove_repo(self, repo):
+        with self._lock, self._db:
+            for table in ("repos", "packages", "provides", "files"):
+                self._db.execute("DELETE FROM %s WHERE repo = ?" % table,
+                                 (repo,))
+            self._forget()
+
+    def names(self):
+        return self.sorted_values("names")
+
+    def provides(self):
+        return self.sorted_values("provides")
+
+    def dependencies(self):
+        """ Returns package names and provides """
+        return self.sorted_values("dependencies")
+
+    def licenses(self):
+        return self.sorted_values("licenses")
+
+    def is_provided(self, provide):
+        """ Returns True if some package provides provide (in any
+            version) """
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM provides WHERE provide = ? OR provide GLOB ? "
+                "LIMIT 1", (provide, _glob_escape(provide) + " *")
+            ).fetchone() is not None
+
+    _QUERIES = {
+        "names": "SELECT DISTINCT name FROM packages",
+        "provides": "SELECT DISTINCT provide FROM provides",
+        "dependencies": "SELECT name FROM packages UNION "
+                        "SELECT provide FROM provides",
+        "licenses": "SELECT DISTINCT license FROM packages "
+                    "WHERE license IS NOT NULL",
+    }
+
+    #: prefix ranges up to this size are ranked directly, longer ones
+    #: are searched in list ordered by length
+    _RANK_RANGE = 2048
+
+    def sorted_values(self, kind):
+        """ Returns sorted list of distinct values of kind (names, provides,
+            dependencies or licenses), list is built only once """
+        with self._lock:
+            values = self._sorted.get(kind)
+            if values is None:
+                values = sorted(set(row[0] for row in
+                                    self._db.execute(self._QUERIES[kind])))
+                self._sorted[kind] = values
+            return values
+
+    def complete(self, kind, prefix, limit=10):
+        """ Returns at most limit values of kind starting with prefix,
+            shorter values (exact match first) are ranked higher """
+        values = self.sorted_values(kind)
+        start = bisect_left(values, prefix)
+        end = bisect_left(values, prefix + "\U0010ffff", start)
+        if end - start <= self._RANK_RANGE:
+            return sorted(values[start:end],
+                          key=lambda _v: (len(_v), _v))[:limit]
+        with self._lock:
+            by_length = self._by_length.get(kind)
+            if by_length is None:
+                by_length = sorted(values, key=lambda _v: (len(_v), _v))
+                self._by_length[kind] = by_length
+        return list(islice((_v for _v in by_length
+                            if _v.startswith(prefix)), limit))
+
+    def resolve(self, files):
+        """ Returns dict file (path or glob) -> name of package that
+            contains it, files without package are left out """
+        result = {}
+        with self._lock:
+            for _file in files:
+                if _file in self._missing:
+                    continue
+                name = self._resolved.get(_file)
+                if name is None:
+                    name = self._lookup(_file)
+                    if name is None:
+                        self._missing.add(_file)
+                        continue
+                    self._resolved[_file] = name
+                result[_file] = name
+        return result
+
+    def _lookup(self, glob):
+        if not _GLOB_CHARS.intersection(glob):
+            query, arg = "path = ?", glob
+        elif glob.startswith("*") and \
+                not _GLOB_CHARS.intersection(glob[1:]):
+            # '*suffix' is prefix of reversed path, that uses index
+            query, arg = "rpath GLOB ?", glob[:0:-1] + "*"
+        else:
+            query, arg = "path GLOB ?", glob
+        row = self._db.execute("SELECT pkg FROM files WHERE " + query +
+                               " ORDER BY rowid LIMIT 1", (arg,)).fetchone()
+        return row[0] if row else None
+
+
+class CachedSack:
+    """ Stands for DNF sack whose data are already in (persistent) index.
+        The real sack is filled by fill function only when query is needed.
+
+:Example:
+
+>>> from rpg.sack_index import CachedSack, SackIndex
+>>> sack = CachedSack(SackIndex(Path("~/.cache/rpg/sack.sqlite")),
+                      fill_dnf_sack)
+>>> SackIndex.get(sack).provides()   # sack is not filled
+>>> sack.query().filter(provides="mvn(junit:junit) = 4.12")
+"""
+
+    def __init__(self, index, fill):
+        self.index = index
+        self._fill = fill
+        self._sack = None
+        self._lock = Lock()
+
+    @property
+    def sack(self):
+        with self._lock:
+            if self._sack is None:
+                self._sack = self._fill()
+            return self._sack
+
+    def query(self):
+        return self.sack.query()
+
+
+def repo_checksum(repo):
+    """ Returns checksum of locally cached metadata of DNF repository or
+        None if they are missing or expired """
+    cache_dir = getattr(repo, "_cachedir", None) or \
+        getattr(repo, "cachedir", None)
+    if not cache_dir:
+        return None
+    repomd = os.path.join(cache_dir, "repodata", "repomd.xml")
+    try:
+        age = time.time() - os.stat(repomd).st_mtime
+        expire = getattr(repo, "metadata_expire", -1)
+        if 0 <= expire < age:
+            return None
+        with open(repomd, "rb") as metadata:
+            return hashlib.sha256(metadata.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _glob_escape(string):
+    return "".join("[%s]" % _c if _c in _GLOB_CHARS else _c for _c in string)
@@ -59,6 +59,11 @@ class Spec:
         "Provides"
     ]
 
+    #: names of keys that can be overridden by one value (in headless
+    #: mode), files and changelog are lists of entries
+    _overridable = _singles + _appendants + [
+        _s for _s in _scripts if _s not in ("files", "changelog")]
+
     def __init__(self):
         # tags
         self.Name = ""  #: initial value: ""
@@ -102,6 +107,26 @@ class Spec:
         self.build_required_files = set()
         self.required_files = set()
 
+    def to_dict(self):
+        """ Returns all properties as dict that can be serialized to JSON,
+            sets, tuples and Commands are tagged, so from_dict restores
+            the same types """
+        return dict((key, _encode(value))
+                    for key, value in vars(self).items())
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Returns spec with properties from dict created by to_dict """
+        spec = cls()
+        spec.load_dict(data)
+        return spec
+
+    def load_dict(self, data):
+        """ Replaces properties of the spec with those from dict created
+            by to_dict """
+        for key, value in data.items():
+            setattr(self, key, _decode(value))
+
     def _get_tags(self):
         block = ''
         for ordered_key in self._singles:
@@ -174,3 +199,34 @@ class Spec:
                 self.author,
                 self.email,
                 msg)
+
+
+def _encode(value):
+    if isinstance(value, Command):
+        return {"__command__": value._command_lines,
+                "rpm_variables": [list(_v) for _v in value.rpm_variables]}
+    if isinstance(value, (set, frozenset)):
+        # sorted, so the same spec has always the same representation
+        return {"__set__": sorted((_encode(_v) for _v in value), key=repr)}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(_v) for _v in value]}
+    if isinstance(value, list):
+        return [_encode(_v) for _v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError("spec property of type {} can't be serialized"
+                    .format(type(value).__name__))
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(_v) for _v in value]
+    if not isinstance(value, dict):
+        return value
+    if "__command__" in value:
+        command = Command(value["__command__"])
+        command.rpm_variables = [tuple(_v) for _v in value["rpm_variables"]]
+        return command
+    if "__set__" in value:
+        return set(_decode(_v) for _v in value["__set__"])
+    return tuple(_decode(_v) for _v in value["__tuple__"])
@@ -1,11 +1,62 @@
+from os import environ, geteuid, getpid, rename, sep
+from os.path import expanduser
+from pathlib import Path
 from re import sub
+from shlex import quote
+import json
 
 
 def path_to_str(path):
-    """ Converts path to string with escaping what needs to be escaped """
-    return sub(r"(\s)", r"\\\1", str(path))
+    """ Converts path to string quoted for shell (if needed) """
+    return quote(str(path))
 
 
 def str_to_pkgname(string):
     """ Converts any string to format suitable for package name """
     return sub(r'[^0-9a-zA-Z]', '', string)
+
+
+def get_cache_dir():
+    """ Returns directory for persistent caches shared between runs """
+    if geteuid() == 0:
+        cache_dir = Path("/var/cache/rpg")
+    else:
+        cache_dir = Path(environ.get("XDG_CACHE_HOME",
+                                     expanduser("~/.cache"))) / "rpg"
+    if not cache_dir.is_dir():
+        cache_dir.mkdir(parents=True)
+    return cache_dir
+
+
+def load_json_cache(path, default=None):
+    """ Loads json cache file, returns default if it is missing or broken """
+    try:
+        with open(str(path)) as cache:
+            return json.load(cache)
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+def save_json_cache(path, data):
+    """ Atomically replaces json cache file, so concurrent readers never see
+        partially written cache """
+    temp = "%s.%d.tmp" % (str(path), getpid())
+    with open(temp, "w") as cache:
+        json.dump(data, cache)
+    rename(temp, str(path))
+
+
+def archive_member_parts(name):
+    """ Splits name of archive member into path components. Returns None
+        if member would be extracted outside of destination directory """
+    if name.startswith("/"):
+        return None
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        return None
+    return parts
+
+
+def is_inside(root, path):
+    """ Returns True if real path is root or is inside of it """
+    return path == root or path.startswith(root + sep)
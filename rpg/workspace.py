@@ -0,0 +1,173 @@
+from pathlib import Path
+from shutil import copy2, copystat, copytree, rmtree
+import errno
+import json
+import logging
+import os
+
+try:
+    from fcntl import ioctl
+except ImportError:
+    ioctl = None
+
+#: ioctl request that makes destination file share extents with source
+FICLONE = 0x40049409
+
+_NOT_SUPPORTED = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL,
+                  errno.ENOSYS, errno.EPERM)
+
+
+class Workspace:
+    """ Content addressed working directory of one project. Its path already
+        contains checksum of the sources, so finished stages recorded in
+        manifest can be reused when the same sources are imported again.
+        States reached by phases are saved as checkpoints under key of
+        their input, so phases don't have to be run again on resume.
+
+:Example:
+
+>>> from pathlib import Path
+>>> from rpg.workspace import Workspace
+>>> workspace = Workspace(Path("/tmp/rpg-5A7D2F1"))
+>>> if not workspace.is_done("extracted", "5A7D2F1"):
+        workspace.clear()
+        extract_sources(workspace.stage_dir("extracted"))
+        workspace.done("extracted", "5A7D2F1")
+"""
+
+    #: stage directories in order they are created, every stage depends
+    #: on all the previous ones
+    stages = ("extracted", "compiled", "installed")
+
+    manifest_name = ".rpg-manifest"
+
+    checkpoints_name = ".rpg-checkpoints"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._manifest = self._load_manifest()
+        self._checkpoints = None
+
+    @property
+    def manifest_path(self):
+        return self.path / self.manifest_name
+
+    def stage_dir(self, stage):
+        return self.path / stage
+
+    def is_done(self, stage, key=""):
+        """ Returns True if stage was finished with the same key (checksum,
+            command...) and its directory still exists """
+        return (self._manifest.get(stage) == key and
+                self.stage_dir(stage).is_dir())
+
+    def done(self, stage, key=""):
+        """ Records that stage was successfully finished """
+        self._manifest[stage] = key
+        self._save_manifest()
+
+    def invalidate(self, stage):
+        """ Forgets stage and all stages that depend on it """
+        for _stage in self.stages[self.stages.index(stage):]:
+            self._manifest.pop(_stage, None)
+        self._save_manifest()
+
+    def reset(self, stage):
+        """ Invalidates stage and leaves its directory empty """
+        self.invalidate(stage)
+        rmtree(str(self.stage_dir(stage)), True)
+        self.stage_dir(stage).mkdir(parents=True)
+
+    def clear(self):
+        """ Removes everything from workspace and creates empty
+            stage directories """
+        rmtree(str(self.path), True)
+        for stage in self.stages:
+            self.stage_dir(stage).mkdir(parents=True)
+        self._manifest = {}
+        self._checkpoints = {}
+        self._save_manifest()
+
+    def checkpoint(self, phase, key):
+        """ Returns state saved after phase that was run with the same key
+            (e.g. digest of its input) or None """
+        if self._checkpoints is None:
+            self._checkpoints = self._load_json(self.checkpoints_name)
+        checkpoint = self._checkpoints.get(phase)
+        if checkpoint and checkpoint["key"] == key:
+            return checkpoint["state"]
+        return None
+
+    def save_checkpoint(self, phase, key, state):
+        """ Saves state (serializable to JSON) reached by phase """
+        if self._checkpoints is None:
+            self._checkpoints = self._load_json(self.checkpoints_name)
+        self._checkpoints[phase] = {"key": key, "state": state}
+        self._save_json(self.checkpoints_name, self._checkpoints)
+
+    def _load_manifest(self):
+        return self._load_json(self.manifest_name)
+
+    def _save_manifest(self):
+        if self._save_json(self.manifest_name, self._manifest):
+            logging.debug("workspace manifest %s: %s"
+                          % (str(self.manifest_path), str(self._manifest)))
+
+    def _load_json(self, name):
+        try:
+            with (self.path / name).open() as content:
+                return json.load(content)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_json(self, name, content):
+        if not self.path.is_dir():
+            return False
+        temp = self.path / (name + ".tmp")
+        with temp.open("w") as _file:
+            json.dump(content, _file)
+        os.rename(str(temp), str(self.path / name))
+        return True
+
+
+def clone_tree(source, dest):
+    """ Materialises source tree in dest (that must not exist). Files are
+        reflinked where filesystem supports it, so only metadata are copied
+        and data are shared until written. Otherwise they are copied. """
+    cloner = _Cloner()
+    copytree(str(source), str(dest), symlinks=True, copy_function=cloner)
+    logging.debug("'%s' materialised in '%s' by %s"
+                  % (str(source), str(dest), cloner.method))
+
+
+class _Cloner:
+    """ copy_function for copytree that remembers whether reflink failed,
+        so unsupported method is tried only once per tree """
+
+    def __init__(self):
+        self.reflink = ioctl is not None
+
+    @property
+    def method(self):
+        return "reflinks" if self.reflink else "copying"
+
+    def __call__(self, src, dst):
+        if self.reflink:
+            try:
+                _reflink(src, dst)
+                return dst
+            except OSError as err:
+                if err.errno not in _NOT_SUPPORTED:
+                    raise
+                self.reflink = False
+        return copy2(src, dst)
+
+
+def _reflink(src, dst):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            os.unlink(dst)
+            raise
+    copystat(src, dst)
@@ -40,4 +40,5 @@ class PackageBuilderTest(RpgTestCase):
 
     def tearDown(self):
         Command("rm -rf " + path_to_str(self.srpm) + "/mock_logs " +
-                path_to_str(self.package_builder.temp_dir / "*.rpm")).execute()
+                path_to_str(self.package_builder.temp_dir) +
+                "/*.rpm").execute()
@@ -13,20 +13,25 @@ class RpgTestCase(TestCase):
         for files in expected:
             self.assertTrue((path / files).exists(), msg=files)
 
-    def assertTarEqualDir(self, t, d):
+    @staticmethod
+    def _strip_names(names, strip):
+        return set("/".join(name.split("/")[strip:]) for name in names
+                   if len(name.rstrip("/").split("/")) > strip)
+
+    def assertTarEqualDir(self, t, d, strip=0):
         def _get_tar_files(t):
             with tarfile.open(str(t)) as tar:
-                return set(tar.getnames())
+                return self._strip_names(tar.getnames(), strip)
 
         def _get_dir_files(d):
             return set([str(f.relative_to(d)) for f in d.glob("**/*")])
 
         self.assertEqual(_get_tar_files(Path(t)), _get_dir_files(Path(d)))
 
-    def assertZipEqualDir(self, z, d):
+    def assertZipEqualDir(self, z, d, strip=0):
         def _get_zip_files(t):
             with zipfile.ZipFile(str(t)) as zip:
-                return set(zip.namelist())
+                return self._strip_names(zip.namelist(), strip)
 
         def _get_dir_files(d):
             return set([str(f.relative_to(d)) + "/"
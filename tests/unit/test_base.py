@@ -1,6 +1,12 @@
 from tests.support import RpgTestCase
 from rpg import Base
+from rpg.package_builder import BuildException
+from rpg.plugins.misc.find_patch import FindPatchPlugin
+from rpg.sack_index import CachedSack
+from pathlib import Path
+from unittest import mock
 import re
+import shutil
 
 
 class BaseTest(RpgTestCase):
@@ -23,3 +29,141 @@ class BaseTest(RpgTestCase):
         self.base.load_project_from_url(self.test_project_dir / "c")
         self.assertTrue(re.match(r"^\/tmp\/rpg-[0-9a-fA-F]+$",
                                  str(self.base.base_dir)))
+
+    def test_download_removed(self):
+        def download(source, dest):
+            shutil.copy(str(self.test_project_dir / "archives" /
+                            "sample.tar.gz"), str(dest))
+
+        self.base._plugin_engine.execute_download = mock.Mock(
+            side_effect=download)
+        self.base.workspace_suffix = "-sample"
+        self.base.load_project_from_url("https://example.com/sample.tar.gz")
+        downloaded = self.base._plugin_engine.execute_download.call_args[0][1]
+        self.assertFalse(downloaded.exists())
+        self.assertTrue(str(self.base.base_dir).endswith("-sample"))
+        self.assertTrue(any(self.base.extracted_dir.iterdir()))
+
+    @mock.patch("rpg.Base.srpm_path", new_callable=mock.PropertyMock,
+                return_value=Path("/tmp/hello-1.0-1.src.rpm"))
+    def test_warm_recover(self, srpm_path):
+        self.base.load_project_from_url(self.test_project_dir / "c")
+        self.base.build_srpm = mock.Mock()
+        builder = self.base._package_builder
+        builder.build_rpm = mock.Mock(side_effect=[
+            BuildException(["a.c:1:18: fatal error: zlib.h: No such file "
+                            "or directory\n"], 1),
+            BuildException([], 0)])
+        builder.last_stage = "build"
+        builder.build_stage = mock.Mock(side_effect=BuildException([], 0))
+        progress = mock.Mock()
+        self.base.build_rpm_recover("fedora-22", "x86_64", progress,
+                                    warm=True)
+        self.assertEqual(builder.build_stage.call_args[0][1:],
+                         ("fedora-22", "x86_64", "build"))
+        self.assertEqual([_c[1].get("keep_chroot", False)
+                          for _c in builder.build_rpm.call_args_list],
+                         [True, False])
+        self.assertEqual([_c[1].get("clean", False)
+                          for _c in builder.build_rpm.call_args_list],
+                         [False, True])
+        progress.assert_called_once_with(1, set())
+        self.assertIn("*zlib.h", self.base.spec.build_required_files)
+
+    @mock.patch("rpg.Base.srpm_path", new_callable=mock.PropertyMock,
+                return_value=Path("/tmp/hello-1.0-1.src.rpm"))
+    def test_build_rpms(self, srpm_path):
+        def build_rpm(builder, srpm, distro, arch, output_dir):
+            self.assertEqual(builder.uniqueext[:3], "rpg")
+            if not output_dir.is_dir():
+                output_dir.mkdir()
+            if arch == "x86_64":
+                (output_dir / "hello-1.0-1.x86_64.rpm").touch()
+                raise BuildException([], 0)
+            raise BuildException(["error: no space\n"], 1)
+
+        self.base.load_project_from_url(self.test_project_dir / "c")
+        targets = [("fedora-22", "x86_64"), ("fedora-22", "i386")]
+        with mock.patch("rpg.PackageBuilder.build_rpm", new=build_rpm):
+            results = self.base.build_rpms(targets, max_workers=2)
+        self.assertEqual(set(results), set(targets))
+        built = results[("fedora-22", "x86_64")]
+        self.assertEqual(built.return_code, 0)
+        self.assertEqual(built.rpms, [self.base.base_dir / "fedora-22-x86_64" /
+                                      "hello-1.0-1.x86_64.rpm"])
+        failed = results[("fedora-22", "i386")]
+        self.assertEqual((failed.return_code, failed.errors, failed.rpms),
+                         (1, ["error: no space\n"], []))
+
+    def test_no_resume(self):
+        self.base.conf.resume = False
+        self.base.load_project_from_url(self.test_project_dir / "c")
+        self.base._project_builder = mock.Mock()
+        for _ in range(2):
+            self.base.build_project()
+            self.base.install_project()
+        self.assertEqual(2, self.base._project_builder.build.call_count)
+        self.assertEqual(2, self.base._project_builder.install.call_count)
+
+    def test_resume(self):
+        def execute_phase(phase, project_dir):
+            self.base.spec.BuildRequires.add(phase)
+
+        self.base.conf.resume = False
+        self.base.load_project_from_url(self.test_project_dir / "c")
+        self.base.conf.resume = True
+        self.base._plugin_engine.execute_phase = mock.Mock(
+            side_effect=execute_phase)
+        self.base.run_extracted_source_analysis()
+        self.base.run_patched_source_analysis()
+        expected = str(self.base.spec)
+
+        resumed = Base()
+        resumed.load_plugins()
+        resumed._plugin_engine.execute_phase = mock.Mock(
+            side_effect=execute_phase)
+        resumed.load_project_from_url(self.test_project_dir / "c")
+        resumed.run_extracted_source_analysis()
+        resumed.run_patched_source_analysis()
+        resumed._plugin_engine.execute_phase.assert_not_called()
+        self.assertEqual(expected, str(resumed.spec))
+        self.assertEqual({"extracted", "patched"},
+                         resumed.spec.BuildRequires)
+
+        # spec changed by user before the phase, so it is run again
+        resumed.spec.Name = "hello"
+        resumed.run_patched_source_analysis()
+        resumed._plugin_engine.execute_phase.assert_called_once_with(
+            "patched", resumed.extracted_dir)
+
+    def test_resume_plugins_and_sack(self):
+        self.base.load_project_from_url(self.test_project_dir / "c")
+        self.base._plugin_engine.execute_phase = mock.Mock()
+
+        def resumes(change):
+            # checkpoint of the phase run by unchanged base
+            self.base.conf.resume = False
+            self.base.run_extracted_source_analysis()
+            self.base.conf.resume = True
+            resumed = Base()
+            resumed.load_plugins()
+            resumed._plugin_engine.execute_phase = mock.Mock()
+            resumed.load_project_from_url(self.test_project_dir / "c")
+            change(resumed)
+            resumed.run_extracted_source_analysis()
+            return not resumed._plugin_engine.execute_phase.called
+
+        def add_plugin(base):
+            base._plugin_engine.plugins.add(FindPatchPlugin())
+
+        def exclude_plugin(base):
+            base.conf.exclude = ["FindPatchPlugin"]
+
+        def load_sack(base):
+            base.sack = CachedSack(mock.Mock(), None)
+            base.sack.index.repo_checksums.return_value = {"fedora": "abc"}
+
+        self.assertTrue(resumes(lambda base: None))
+        self.assertFalse(resumes(add_plugin))
+        self.assertFalse(resumes(exclude_plugin))
+        self.assertFalse(resumes(load_sack))
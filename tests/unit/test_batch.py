@@ -0,0 +1,82 @@
+from tests.support import RpgTestCase
+from rpg import Base
+from rpg.batch import BatchRun, parse_manifest
+from rpg.plugin_engine import PluginEngine
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import mock
+import json
+import logging
+import shutil
+
+
+class BatchTest(RpgTestCase):
+
+    def setUp(self):
+        self.base = Base()
+        self.base.conf.load_dnf = False
+        for step in ("load_plugins", "run_extracted_source_analysis",
+                     "run_patched_source_analysis", "build_project",
+                     "run_compiled_source_analysis", "install_project",
+                     "run_installed_source_analysis", "build_srpm"):
+            setattr(self.base, step, mock.Mock())
+        self.base.load_plugins.side_effect = lambda: setattr(
+            self.base, "_plugin_engine", PluginEngine(self.base.spec, None))
+        self.log_dir = Path(mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(str(self.log_dir))
+
+    def test_parse_manifest(self):
+        projects = parse_manifest([
+            "https://github.com/example/ex_repo",
+            {"source": "/tmp/hello.tar.gz", "name": "hello",
+             "set": {"Version": "1.0", "Requires": ["zlib", "bash"]},
+             "targets": [["fedora-22", "x86_64"]]}])
+        self.assertEqual(["000-ex_repo", "hello"],
+                         [_p["name"] for _p in projects])
+        self.assertEqual([("Requires", "zlib"), ("Requires", "bash"),
+                          ("Version", "1.0")], projects[1]["overrides"])
+        self.assertEqual([("fedora-22", "x86_64")], projects[1]["targets"])
+        self.assertEqual(["000-a", "001-a"],
+                         [_p["name"] for _p in parse_manifest(["a", "a"])])
+        self.assertRaises(ValueError, parse_manifest,
+                          [{"source": "a", "name": "x"},
+                           {"source": "b", "name": "x"}])
+        self.assertRaises(ValueError, parse_manifest,
+                          [{"source": "a", "name": "../x"}])
+        self.assertRaises(ValueError, parse_manifest,
+                          [{"source": "a", "set": {"foo": "1"}}])
+        self.assertRaises(ValueError, parse_manifest,
+                          [{"source": "a", "set": {"files": ["/usr/bin/a"]}}])
+        self.assertRaises(ValueError, parse_manifest, [{"name": "a"}])
+
+    @mock.patch("rpg.Base.srpm_path", new_callable=mock.PropertyMock,
+                return_value=Path("/tmp/hello-1.0-1.src.rpm"))
+    def test_batch(self, srpm_path):
+        def load_project(source):
+            logging.info("loading {} into workspace rpg-<hash>{}"
+                         .format(source, self.base.workspace_suffix))
+            if source == "broken":
+                raise RuntimeError("No plugin to extract 'broken'!")
+
+        self.base.load_project_from_url = mock.Mock(side_effect=load_project)
+        results = BatchRun(self.base, [
+            {"source": "hello", "set": {"Version": "1.0"}}, "broken"],
+            jobs=2, log_dir=self.log_dir).run()
+        self.base.load_plugins.assert_called_once_with()
+        self.assertEqual((1, 1), (results["succeeded"], results["failed"]))
+        hello, broken = results["projects"]
+        self.assertEqual(("000-hello", True), (hello["name"],
+                                               hello["success"]))
+        self.assertIn("Version: 1.0\n", hello["spec"])
+        self.assertIn("srpm", hello["timings"]["steps"])
+        self.assertEqual([], hello["timings"]["plugins"]["phases"])
+        self.assertEqual(["extraction"], list(broken["timings"]["steps"]))
+        self.assertEqual("RuntimeError", broken["errors"][0]["type"])
+        with open(hello["log"]) as log:
+            self.assertIn("loading hello into workspace rpg-<hash>-000-hello",
+                          log.read())
+        with open(broken["log"]) as log:
+            self.assertNotIn("loading hello", log.read())
+        json.dumps(results)
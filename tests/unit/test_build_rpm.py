@@ -2,15 +2,9 @@ from rpg.package_builder import PackageBuilder, BuildException
 from tests.support import RpgTestCase
 from unittest import mock
 from pathlib import Path
-
-
-class MockedSTDOUT(object):
-
-    def __init__(self, string):
-        self.string = string
-
-    def readline(self):
-        return self.string
+from shutil import rmtree
+import os
+import tempfile
 
 
 class MockedSubprocess(object):
@@ -33,7 +27,7 @@ class MockedSubprocess(object):
         b'mockbuild.exception.Error: Command failed. See logs for output.\n',
         b' # bash --login -c /usr/bin/rpmbuild -bb --target x86_64 --nodeps' +
         b'  /builddir/build/SPECS/a.spec \n',
-        b'INFO: LEAVE do --> EXCEPTION RAISED\n',
+        b'INFO: LEAVE do --> EXCEPTION RAISED',
     ]
 
     ErrorText = [
@@ -41,40 +35,139 @@ class MockedSubprocess(object):
         b'    raise exception.Error("Command failed. ' +
         b'See logs for output.\\n # %s" % (command,), child.returncode)\n',
         b'mockbuild.exception.Error: Command failed. See logs for output.\n',
-        b'INFO: LEAVE do --> EXCEPTION RAISED\n',
+        b'INFO: LEAVE do --> EXCEPTION RAISED',
     ]
 
+    text = MockedText
+    build_log = ""
+
     def __init__(self, cmd):
         self.cmd = cmd
-        self.poll_ite = 10
+        if cmd[-1].startswith("--resultdir="):
+            resultdir = cmd[-1][len("--resultdir="):]
+            with open(os.path.join(resultdir, "build.log"), "w") as log:
+                log.write(self.build_log)
+        self.returncode = 1
+        self.terminated = False
+        read_end, write_end = os.pipe()
+        # the last line is written without new line and the process exits
+        # before it is read
+        os.write(write_end, b"".join(self.text))
+        os.close(write_end)
+        self.stdout = os.fdopen(read_end, "rb")
 
     @staticmethod
     def Popen(cmd, **kwargs):
-        return MockedSubprocess(cmd)
+        MockedSubprocess.last = MockedSubprocess(cmd)
+        return MockedSubprocess.last
 
     def poll(self):
-        self.poll_ite -= 1
-        self.stdout = MockedSTDOUT(MockedSubprocess.MockedText[self.poll_ite])
-        return None if self.poll_ite != -1 else True
+        return self.returncode
 
-    @staticmethod
-    def returncode(self):
-        return 1
+    def wait(self):
+        return self.returncode
+
+    def terminate(self):
+        self.terminated = True
 
 
 class BuildLogParseTest(RpgTestCase):
 
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.builder = PackageBuilder()
+        self.builder.temp_dir = self.temp_dir
+
+    def tearDown(self):
+        rmtree(str(self.temp_dir))
+        MockedSubprocess.text = MockedSubprocess.MockedText
+        MockedSubprocess.build_log = ""
+
     @mock.patch('subprocess.Popen', new=MockedSubprocess.Popen)
     @mock.patch('subprocess.PIPE', new=MockedSubprocess.PIPE)
     @mock.patch('subprocess.STDOUT', new=MockedSubprocess.STDOUT)
     @mock.patch('rpg.command.Command.execute', new=lambda *args: args)
-    @mock.patch('rpg.package_builder.PackageBuilder._check_logs',
-                new=lambda *args: args)
     def test_rpm_build_err_parse(self):
+        MockedSubprocess.build_log = (
+            "gcc -c main.c\nmain.c:1:19: fatal error: "
+            "zlib.h: No such file or directory\n")
+        events = []
+        with self.assertRaises(BuildException) as be:
+            self.builder.build_rpm("", "", "", self.temp_dir / "out",
+                                   on_error=events.append)
+        self.assertEqual(be.exception.return_code, 1)
+        self.assertEqual(
+            sorted(be.exception.errors),
+            sorted([text.decode("utf-8")
+                    for text in MockedSubprocess.ErrorText] +
+                   ["main.c:1:19: fatal error: zlib.h: No such file or "
+                    "directory\n"]))
+        self.assertEqual(set(["mock", "build.log"]),
+                         set(_e.source for _e in events))
+        self.assertFalse(any(_e.fatal for _e in events))
+        self.assertFalse(MockedSubprocess.last.terminated)
+
+    @mock.patch('subprocess.Popen', new=MockedSubprocess.Popen)
+    @mock.patch('rpg.command.Command.execute', new=lambda *args: args)
+    def test_rpm_build_abort(self):
+        MockedSubprocess.text = [
+            b"Start: build phase for a.src.rpm\n",
+            b"OSError: [Errno 28] No space left on device\n"]
         with self.assertRaises(BuildException) as be:
-            PackageBuilder().build_rpm(
-                "", "", "", Path(""))
-            self.assertEqual(
-                sorted(be.errors),
-                sorted([text.decode("utf-8")
-                        for text in MockedSubprocess.ErrorText]))
+            self.builder.build_rpm("", "", "", self.temp_dir / "out")
+        self.assertEqual(be.exception.errors,
+                         ["OSError: [Errno 28] No space left on device\n"])
+        self.assertTrue(MockedSubprocess.last.terminated)
+
+    @mock.patch('subprocess.Popen', new=MockedSubprocess.Popen)
+    @mock.patch('rpg.command.Command.execute', new=lambda *args: args)
+    def test_rpm_build_stage(self):
+        MockedSubprocess.text = [
+            b"Executing(%prep): /bin/sh -e /var/tmp/rpm-tmp.1\n",
+            b"Executing(%build): /bin/sh -e /var/tmp/rpm-tmp.2\n",
+            b"main.c:1:19: fatal error: zlib.h: No such file or directory\n"]
+        with self.assertRaises(BuildException):
+            self.builder.build_rpm("", "fedora-22", "x86_64",
+                                   self.temp_dir / "out", keep_chroot=True)
+        self.assertIn("--no-cleanup-after", MockedSubprocess.last.cmd)
+        self.assertEqual(self.builder.last_stage, "build")
+        self.assertTrue(self.builder.can_build_stage("build"))
+        self.assertFalse(self.builder.can_build_stage("prep"))
+        MockedSubprocess.text = []
+        with self.assertRaises(BuildException):
+            self.builder.build_stage("hello.spec", "fedora-22", "x86_64",
+                                     "build")
+        self.assertEqual(MockedSubprocess.last.cmd[-1],
+                         "rpmbuild -bc --short-circuit --nodeps "
+                         "/builddir/build/SPECS/hello.spec")
+
+    @mock.patch('subprocess.Popen', new=MockedSubprocess.Popen)
+    @mock.patch('rpg.command.Command.execute', new=lambda *args: args)
+    def test_rpm_build_clean(self):
+        MockedSubprocess.text = []
+        with self.assertRaises(BuildException):
+            self.builder.build_rpm("", "fedora-22", "x86_64",
+                                   self.temp_dir / "out")
+        self.assertIn("--no-clean", MockedSubprocess.last.cmd)
+        with self.assertRaises(BuildException):
+            self.builder.build_rpm("", "fedora-22", "x86_64",
+                                   self.temp_dir / "out", clean=True)
+        self.assertNotIn("--no-clean", MockedSubprocess.last.cmd)
+
+    @mock.patch('subprocess.Popen', new=MockedSubprocess.Popen)
+    @mock.patch('rpg.command.Command.execute', new=lambda *args: args)
+    def test_rpm_build_argv(self):
+        MockedSubprocess.text = []
+        srpm = self.temp_dir / "hello world-1.0-1.src.rpm"
+        with self.assertRaises(BuildException):
+            self.builder.build_rpm(srpm, "fedora-22", "x86_64",
+                                   self.temp_dir / "out")
+        self.assertIn(str(srpm), MockedSubprocess.last.cmd)
+
+    def test_install_packages(self):
+        with mock.patch("subprocess.check_output") as check_output:
+            self.builder.install_packages("fedora-22", "x86_64",
+                                          set(["zlib-devel", "a b"]))
+        self.assertEqual(check_output.call_args[0][0],
+                         ["mock", "--root", "fedora-22-x86_64",
+                          "--install", "a b", "zlib-devel"])
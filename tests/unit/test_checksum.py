@@ -0,0 +1,45 @@
+from tests.support import RpgTestCase
+from rpg.checksum import SourceHasher
+from pathlib import Path
+from shutil import copytree, rmtree
+from unittest import mock
+import os
+import tempfile
+
+
+class SourceHasherTest(RpgTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.project = self.temp_dir / "patch"
+        copytree(str(self.test_project_dir / "patch"), str(self.project))
+        self.manifest = self.temp_dir / "checksums.json"
+
+    def test_tree_digest(self):
+        digest = SourceHasher(self.manifest).hexdigest(self.project)
+        self.assertEqual(len(digest), 40)
+        with (self.project / "0.patch").open("a") as patch:
+            patch.write("\n")
+        self.assertNotEqual(
+            digest, SourceHasher(self.manifest).hexdigest(self.project))
+
+    def test_fifo(self):
+        digest = SourceHasher().hexdigest(self.project)
+        os.mkfifo(str(self.project / "fifo"))
+        self.assertEqual(digest, SourceHasher().hexdigest(self.project))
+
+    def test_manifest_reuse(self):
+        digest = SourceHasher(self.manifest).hexdigest(self.project)
+        hasher = SourceHasher(self.manifest)
+        with mock.patch.object(hasher, "_hash_file") as hash_file:
+            self.assertEqual(digest, hasher.hexdigest(self.project))
+            self.assertFalse(hash_file.called)
+
+    def test_file_digest(self):
+        hasher = SourceHasher()
+        self.assertEqual(
+            hasher.hexdigest(self.project / "0.patch"),
+            hasher._hash_file(str(self.project / "0.patch")))
+
+    def tearDown(self):
+        rmtree(str(self.temp_dir))
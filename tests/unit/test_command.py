@@ -1,8 +1,11 @@
 from pathlib import Path
 from tests.support import RpgTestCase
 from rpg.command import Command
+from rpg.profiler import spawned_in_thread
 from rpg.utils import path_to_str
+from shutil import rmtree
 import subprocess
+import tempfile
 
 
 class PluginEngineTest(RpgTestCase):
@@ -46,3 +49,35 @@ class PluginEngineTest(RpgTestCase):
     def test_new_line(self):
         cmd = Command("a\nb\n")
         self.assertEqual("a\nb", str(cmd))
+
+    def test_file_operations(self):
+        temp = Path(tempfile.mkdtemp()) / "dir with space"
+        spawned = spawned_in_thread()
+        Command("mkdir -p " + path_to_str(temp / "a" / "b")).execute()
+        (temp / "a" / "b" / "f.txt").touch()
+        cmd = Command(["cp -r a c", "cp a/b/f.txt a/g.txt",
+                       "mv a/g.txt c/", "mkdir d", "rm -rf a"])
+        self.assertEqual("", cmd.execute(temp))
+        self.assertEqual(spawned, spawned_in_thread())
+        self.assertExistInDir(["c/b/f.txt", "c/g.txt", "d"], temp)
+        self.assertFalse((temp / "a").exists())
+        with self.assertRaises(subprocess.CalledProcessError):
+            Command("mkdir d").execute(temp)
+        rmtree(str(temp.parent))
+
+    def test_argv(self):
+        spawned = spawned_in_thread()
+        cmd = Command(["echo 'a  b' c", "echo \"$HOME\" | cat"])
+        self.assertEqual("%s\n" % self.test_project_dir.resolve(),
+                         Command("pwd").execute(self.test_project_dir))
+        self.assertEqual(spawned + 1, spawned_in_thread())
+        self.assertEqual("a  b c\n", Command("echo 'a  b' c").execute())
+        with self.assertRaises(subprocess.CalledProcessError) as ctx:
+            Command(["echo a", "false", "echo b"]).execute()
+        self.assertEqual((1, ["false"], "a\n"),
+                         (ctx.exception.returncode, ctx.exception.cmd,
+                          ctx.exception.output))
+        self.assertRaises(subprocess.CalledProcessError,
+                          Command("nonexistent-rpg-command").execute)
+        # pipe needs shell
+        self.assertEqual("a  b c\n/", cmd.execute()[:8])
@@ -22,3 +22,24 @@ class ConfTest(RpgTestCase):
         conf = Conf()
         conf.parse_cmdline()
         self.assertEqual(str(["TestPlugin"]), str(conf.exclude))
+
+    def test_headless(self):
+        sys.argv = ["rpg", "--headless", "hello.tar.gz",
+                    "--set", "Version=1.0", "Requires=zlib",
+                    "--target", "fedora-22", "x86_64",
+                    "--target", "fedora-23", "i386", "--build-jobs", "1"]
+        conf = Conf()
+        conf.parse_cmdline()
+        self.assertEqual("hello.tar.gz", conf.headless)
+        self.assertEqual([("Version", "1.0"), ("Requires", "zlib")],
+                         conf.spec_overrides)
+        self.assertEqual([("fedora-22", "x86_64"), ("fedora-23", "i386")],
+                         conf.targets)
+        self.assertEqual(1, conf.build_jobs)
+        sys.argv = ["rpg", "--headless", "hello.tar.gz", "--build-jobs", "0"]
+        self.assertRaises(SystemExit, Conf().parse_cmdline)
+        sys.argv = ["rpg", "--headless", "hello.tar.gz", "--set", "foo=1"]
+        self.assertRaises(SystemExit, Conf().parse_cmdline)
+        sys.argv = ["rpg", "--headless", "hello.tar.gz",
+                    "--set", "files=/usr/bin/hello"]
+        self.assertRaises(SystemExit, Conf().parse_cmdline)
@@ -0,0 +1,55 @@
+from tests.support import RpgTestCase
+from rpg import content_type as ct
+from importlib.util import find_spec
+from pathlib import Path
+from shutil import rmtree
+from unittest import mock
+import py_compile
+import sys
+import tempfile
+
+
+class ContentTypeTest(RpgTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        rmtree(str(self.temp_dir))
+
+    def test_project_files(self):
+        paths = [self.test_project_dir / "patch" / "0.patch",
+                 self.test_project_dir / "libs" / "libstatic.a",
+                 self.test_project_dir / "libs" / "libdynamic.so.1",
+                 self.test_project_dir / "translation" / "CZ.mo",
+                 self.test_project_dir / "c" / "sourcecode.c",
+                 self.test_project_dir / "patch"]
+        types = ct.content_types(paths)
+        self.assertEqual(
+            [types[_p] for _p in paths],
+            [ct.PATCH, ct.AR_ARCHIVE, ct.OTHER, ct.GETTEXT, ct.OTHER,
+             ct.DIRECTORY])
+
+    def test_elf(self):
+        self.assertEqual(ct.content_type(sys.executable), ct.ELF_EXECUTABLE)
+        module = find_spec("_ctypes") or find_spec("math")
+        if module.origin.endswith(".so"):
+            self.assertEqual(ct.content_type(module.origin), ct.ELF_SHARED)
+
+    def test_script_and_bytecode(self):
+        script = self.temp_dir / "script.py"
+        with script.open("w") as source:
+            source.write("#!/usr/bin/python3\nimport os\n")
+        bytecode = self.temp_dir / "script.pyc"
+        py_compile.compile(str(script), str(bytecode))
+        self.assertEqual(ct.content_type(script), ct.SCRIPT)
+        self.assertEqual(ct.content_type(bytecode), ct.PYTHON_BYTECODE)
+
+    def test_cache(self):
+        patch = self.temp_dir / "fix.patch"
+        with patch.open("w") as source:
+            source.write("--- a/x.c\n+++ b/x.c\n@@ -1 +1 @@\n-a\n+b\n")
+        self.assertEqual(ct.content_type(patch), ct.PATCH)
+        with mock.patch("rpg.content_type.open", create=True) as _open:
+            self.assertEqual(ct.content_type(patch), ct.PATCH)
+            self.assertFalse(_open.called)
@@ -0,0 +1,61 @@
+from tests.support import RpgTestCase
+from rpg.file_index import FileIndex
+from pathlib import Path
+from shutil import rmtree
+import os
+import tempfile
+
+
+class FileIndexTest(RpgTestCase):
+
+    def test_buckets(self):
+        index = FileIndex(self.test_project_dir)
+        self.assertEqual(
+            sorted(_f.name for _f in index.with_suffix(".patch")),
+            ["0.patch", "1.patch", "2.patch"])
+        self.assertEqual(
+            [str(_f.path) for _f in index.named("CMakeLists.txt")],
+            [str(self.test_project_dir / "c" / "CMakeLists.txt")])
+        self.assertEqual(
+            sorted(_f.name for _f in index.match("lib*")),
+            ["libdynamic.so.1", "libs", "libstatic.a"])
+        self.assertIn("patch", [_f.name for _f in index.top_level()])
+        self.assertTrue(all(_f.is_file for _f in index.files()))
+
+    def test_active_index(self):
+        project_dir = self.test_project_dir / "patch"
+        with FileIndex.activate(project_dir) as index:
+            self.assertIs(index, FileIndex.get(project_dir))
+        self.assertIsNot(index, FileIndex.get(project_dir))
+
+    def test_refresh_swaps_contents(self):
+        index = FileIndex(self.test_project_dir / "patch")
+        patches = index.with_suffix(".patch")
+        scan = index._scan
+        seen = []
+
+        def scan_and_read(*args):
+            # readers see complete old contents while tree is walked
+            seen.append(index.with_suffix(".patch"))
+            scan(*args)
+
+        index._scan = scan_and_read
+        index.refresh()
+        self.assertEqual(patches, seen[0])
+        self.assertEqual(patches, index.with_suffix(".patch"))
+
+    def test_links(self):
+        root = Path(tempfile.mkdtemp())
+        try:
+            (root / "dir").mkdir()
+            (root / "dir" / "file").touch()
+            os.symlink("dir", str(root / "dir_link"))
+            os.symlink("missing", str(root / "broken"))
+            entries = dict((_e.name, (_e.is_file, _e.is_dir, _e.is_link))
+                           for _e in FileIndex(root))
+        finally:
+            rmtree(str(root))
+        self.assertEqual({"dir": (False, True, False),
+                          "file": (True, False, False),
+                          "dir_link": (False, True, True),
+                          "broken": (False, False, True)}, entries)
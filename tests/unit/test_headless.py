@@ -0,0 +1,80 @@
+from tests.support import RpgTestCase
+from rpg import Base
+from rpg.command import Command
+from rpg.headless import HeadlessRun
+from rpg.package_builder import BuildResult
+from pathlib import Path
+from unittest import mock
+import json
+import logging
+
+
+class HeadlessTest(RpgTestCase):
+
+    def setUp(self):
+        self.base = Base()
+        self.base.conf.load_dnf = False
+        for step in ("load_plugins", "load_project_from_url",
+                     "run_extracted_source_analysis",
+                     "run_patched_source_analysis", "build_project",
+                     "run_compiled_source_analysis", "install_project",
+                     "run_installed_source_analysis", "build_srpm",
+                     "build_rpms"):
+            setattr(self.base, step, mock.Mock())
+
+    @mock.patch("rpg.Base.srpm_path", new_callable=mock.PropertyMock,
+                return_value=Path("/tmp/hello-1.0-1.src.rpm"))
+    def test_run(self, srpm_path):
+        def extracted():
+            self.base.spec.Name = "guessed"
+            self.base.spec.Version = "0.1"
+            logging.error("error during executing plugin")
+
+        self.base.run_extracted_source_analysis.side_effect = extracted
+        self.base.build_rpms.return_value = {
+            ("fedora-22", "x86_64"): BuildResult(
+                0, [], Path("/tmp/out"), [Path("/tmp/out/hello.rpm")],
+                Path("/tmp/out/mock_logs"))}
+        report = HeadlessRun(self.base, "hello.tar.gz",
+                             [("Version", "1.0"), ("Requires", "zlib")],
+                             [("fedora-22", "x86_64")], build_jobs=1).run()
+        self.base.load_project_from_url.assert_called_once_with(
+            "hello.tar.gz")
+        self.base.build_rpms.assert_called_once_with(
+            [("fedora-22", "x86_64")], 1)
+        self.assertTrue(report["success"])
+        self.assertIn("Name: guessed\nVersion: 1.0\n", report["spec"])
+        self.assertIn("Requires:\tzlib\n", report["spec"])
+        self.assertEqual(["load_plugins", "extraction", "extracted",
+                          "patched", "build", "compiled", "install",
+                          "installed", "srpm", "rpm"],
+                         list(report["timings"]["steps"]))
+        self.assertEqual([("extracted", "log")],
+                         [(_e["step"], _e["type"])
+                          for _e in report["errors"]])
+        self.assertEqual("/tmp/hello-1.0-1.src.rpm",
+                         report["results"]["srpm"])
+        self.assertEqual(["/tmp/out/hello.rpm"],
+                         report["results"]["rpms"]["fedora-22-x86_64"]
+                         ["rpms"])
+        json.dumps(report)
+
+    def test_script_override(self):
+        run = HeadlessRun(self.base, "hello.tar.gz",
+                          [("build", "make all"), ("License", "MIT")])
+        run.apply_overrides()
+        self.assertIsInstance(self.base.spec.build, Command)
+        self.assertIn("%build\nmake all\n", str(self.base.spec))
+        self.assertEqual("MIT", self.base.spec.License)
+        self.assertRaises(ValueError, HeadlessRun, self.base, "hello.tar.gz",
+                          [("files", "/usr/bin/hello")])
+
+    def test_failed_step(self):
+        self.base.build_project.side_effect = RuntimeError("make failed")
+        report = HeadlessRun(self.base, "hello.tar.gz").run()
+        self.assertFalse(report["success"])
+        self.assertNotIn("compiled", report["timings"]["steps"])
+        self.assertEqual([("build", "RuntimeError", "make failed")],
+                         [(_e["step"], _e["type"], _e["message"])
+                          for _e in report["errors"]])
+        self.base.run_compiled_source_analysis.assert_not_called()
@@ -0,0 +1,52 @@
+from tests.support import RpgTestCase
+from rpg.import_scanner import ImportScanner
+from pathlib import Path
+from shutil import rmtree
+from unittest import mock
+import tempfile
+
+
+class ImportScannerTest(RpgTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.cache = self.temp_dir / "imports.json"
+        self.sources = [self.temp_dir / "app.py", self.temp_dir / "old.py"]
+        with self.sources[0].open("w") as source:
+            source.write("import os.path, json\nfrom . import views\n"
+                         "from xml.dom import minidom\nimport old\n"
+                         "def f():\n    import math\n")
+        with self.sources[1].open("w") as source:
+            source.write("import sys\nprint 'python 2'\n")
+
+    def tearDown(self):
+        rmtree(str(self.temp_dir))
+
+    def test_imported_modules(self):
+        scanner = ImportScanner(self.cache)
+        self.assertEqual(scanner.imported_modules(self.sources),
+                         set(["os", "json", "xml", "math", "old", "sys"]))
+
+    def test_parallel(self):
+        scanner = ImportScanner(self.cache, workers=2)
+        scanner.chunk_size = 1
+        self.assertEqual(scanner.imported_modules(self.sources),
+                         set(["os", "json", "xml", "math", "old", "sys"]))
+
+    def test_resolve_cache(self):
+        files = ImportScanner(self.cache).scan(self.sources, ["old"])
+        self.assertIn(ImportScanner(self.cache).resolve("json"), files)
+        with mock.patch("rpg.import_scanner.find_spec") as find_spec:
+            self.assertEqual(
+                ImportScanner(self.cache).scan(self.sources, ["old"]), files)
+            self.assertFalse(find_spec.called)
+
+    def test_missing_not_cached(self):
+        scanner = ImportScanner(self.cache)
+        self.assertIsNone(scanner.resolve("rpg_missing_module"))
+        scanner.save()
+        with mock.patch("rpg.import_scanner.find_spec") as find_spec:
+            find_spec.return_value = mock.Mock(origin="/usr/lib/mod.py")
+            with mock.patch("os.path.exists", return_value=True):
+                self.assertEqual(ImportScanner(self.cache).resolve(
+                    "rpg_missing_module"), "/usr/lib/mod.py")
@@ -0,0 +1,96 @@
+from tests.support import RpgTestCase
+from rpg.include_scanner import IncludeScanner
+from pathlib import Path
+from shutil import rmtree
+from unittest import mock
+import tempfile
+
+
+class IncludeScannerTest(RpgTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.system = self.temp_dir / "include"
+        self.project = self.temp_dir / "project"
+        (self.system / "sys").mkdir(parents=True)
+        self.project.mkdir()
+        self._write(self.system / "stdio.h",
+                    "#ifndef STDIO\n#include <sys/types.h>\n#endif\n")
+        self._write(self.system / "sys" / "types.h",
+                    '#include "cdefs.h"\n#include <stdio.h>\n')
+        self._write(self.system / "sys" / "cdefs.h", "")
+        self._write(self.system / "unused.h", "")
+        self._write(self.project / "main.c",
+                    '#include "local.h"\n  # include <missing.h>\n'
+                    '// #include <unused.h>\nint main() {}\n')
+        self._write(self.project / "local.h", "#include <stdio.h>\n")
+        self.cache = self.temp_dir / "includes.json"
+
+    def tearDown(self):
+        rmtree(str(self.temp_dir))
+
+    @staticmethod
+    def _write(path, content):
+        with path.open("w") as source:
+            source.write(content)
+
+    def test_scan(self):
+        scanner = IncludeScanner(self.cache, [str(self.system)])
+        self.assertEqual(
+            scanner.scan([self.project / "main.c"]),
+            set([str(self.project / "local.h"),
+                 str(self.system / "stdio.h"),
+                 str(self.system / "sys" / "types.h"),
+                 str(self.system / "sys" / "cdefs.h")]))
+
+    def test_cache(self):
+        IncludeScanner(self.cache, [str(self.system)]).scan(
+            [self.project / "main.c"])
+        scanner = IncludeScanner(self.cache, [str(self.system)])
+        with mock.patch("rpg.include_scanner.open", create=True,
+                        side_effect=open) as _open:
+            headers = scanner.scan([self.project / "main.c"])
+            opened = set(_call[0][0] for _call in _open.call_args_list)
+        self.assertIn(str(self.system / "sys" / "cdefs.h"), headers)
+        self.assertEqual(opened, set([str(self.project / "main.c"),
+                                      str(self.project / "local.h")]))
+
+    def test_shards(self):
+        sources = []
+        for i in range(5):
+            sources.append(self.project / ("file%d.c" % i))
+            self._write(sources[-1], "#include <stdio.h>\n")
+        scanner = IncludeScanner(self.cache, [str(self.system)], workers=2)
+        scanner.shard_size = 2
+        self.assertEqual(
+            scanner.scan(sources),
+            set([str(self.system / "stdio.h"),
+                 str(self.system / "sys" / "types.h"),
+                 str(self.system / "sys" / "cdefs.h")]))
+        self.assertIn(str(self.system / "stdio.h"),
+                      IncludeScanner(self.cache)._cached["direct"])
+        self.assertIn(str(self.system / "stdio.h"),
+                      IncludeScanner(self.cache)._cached["closures"])
+
+    def test_closures(self):
+        scanner = IncludeScanner(None, [str(self.system)])
+        self._write(self.project / "other.c", "#include <sys/types.h>\n")
+        with mock.patch.object(scanner, "_finish",
+                               wraps=scanner._finish) as finish:
+            scanner.scan([self.project / "main.c", self.project / "other.c"])
+        # main.c, local.h, cdefs.h, other.c and stdio.h with sys/types.h
+        # that include each other, system headers are walked only once
+        self.assertEqual(5, finish.call_count)
+        self.assertEqual(
+            scanner._closure[str(self.system / "sys" / "types.h")],
+            set([str(self.system / "stdio.h"),
+                 str(self.system / "sys" / "cdefs.h")]))
+
+    def test_closure_invalidation(self):
+        self._write(self.system / "sys" / "cdefs.h", "#include <new.h>\n")
+        IncludeScanner(self.cache, [str(self.system)]).scan(
+            [self.project / "main.c"])
+        self._write(self.system / "new.h", "")
+        self.assertIn(str(self.system / "new.h"),
+                      IncludeScanner(self.cache, [str(self.system)]).scan(
+                          [self.project / "main.c"]))
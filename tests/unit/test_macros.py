@@ -0,0 +1,44 @@
+from tests.support import RpgTestCase
+from rpg import macros
+from unittest import mock
+
+
+class MacrosTest(RpgTestCase):
+
+    def setUp(self):
+        macros.invalidate()
+        self.values = {"%{_topdir}": "/tmp/rpmbuild",
+                       "%{_topdir}/SOURCES": "/tmp/rpmbuild/SOURCES"}
+        patcher = mock.patch(
+            "rpg.macros.rpm.expandMacro",
+            side_effect=lambda _m: self.values.get(_m, _m))
+        self.expand_macro = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(macros.invalidate)
+
+    def test_cache(self):
+        self.assertEqual(["/tmp/rpmbuild/SOURCES", "make", "/tmp/rpmbuild",
+                          "/tmp/rpmbuild"],
+                         macros.expand_all(["%{_topdir}/SOURCES", "make",
+                                            "%{_topdir}", "%{_topdir}"]))
+        self.assertEqual(2, self.expand_macro.call_count)
+        self.assertEqual("/tmp/rpmbuild", macros.expand("%{_topdir}"))
+        self.assertEqual(2, self.expand_macro.call_count)
+
+    def test_dynamic(self):
+        macros.expand("%(date)")
+        macros.expand("%(date)")
+        self.assertEqual(2, self.expand_macro.call_count)
+
+    @mock.patch("rpg.macros.rpm.addMacro")
+    @mock.patch("rpg.macros.rpm.delMacro")
+    def test_define(self, del_macro, add_macro):
+        macros.expand("%{_topdir}")
+        macros.define("_topdir", "/home/user/rpmbuild")
+        add_macro.assert_called_once_with("_topdir", "/home/user/rpmbuild")
+        self.values["%{_topdir}"] = "/home/user/rpmbuild"
+        self.assertEqual("/home/user/rpmbuild", macros.expand("%{_topdir}"))
+        macros.undefine("_topdir")
+        del_macro.assert_called_once_with("_topdir")
+        macros.expand("%{_topdir}")
+        self.assertEqual(3, self.expand_macro.call_count)
@@ -1,7 +1,11 @@
 from tests.support import PluginTestCase
+from rpg.command import Command
+from rpg.plugin import Plugin
 from rpg.plugin_engine import PluginEngine
+from rpg.profiler import counted
 from tests.project.py.plugin0 import TestPlugin
 from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 
 
 class PluginEngineTest(PluginTestCase):
@@ -14,7 +18,20 @@ class PluginEngineTest(PluginTestCase):
         self.plugin_engine.load_plugins(self.plugin_dir)
         self.assertEqual(len(self.plugin_engine.plugins), 1)
         self.assertTrue(
-            isinstance(self.plugin_engine.plugins.pop(), TestPlugin))
+            isinstance(self.plugin_engine.plugins.pop().instance, TestPlugin))
+
+    def test_registry_cache(self):
+        self.plugin_dir = self.test_project_dir / "py"
+        self.plugin_engine.load_plugins(self.plugin_dir)
+        engine = PluginEngine(self.spec, self.sack,
+                              registry=self.plugin_engine.registry)
+        with mock.patch("rpg.plugin_registry.import_module") as imp:
+            engine.load_plugins(self.plugin_dir)
+            plugin = engine.plugins.pop()
+            self.assertFalse(imp.called)
+            self.assertEqual(plugin.name, "TestPlugin")
+            self.assertIsNone(engine.load_method(plugin, "installed"))
+            self.assertFalse(imp.called)
 
     def test_exclude_plugins(self):
         self.plugin_dir = self.test_project_dir / "py"
@@ -36,3 +53,60 @@ class PluginEngineTest(PluginTestCase):
             self.plugin_engine.plugins[0],
             self.plugin_engine.phases[0]).call_args_list
         self.assertEqual(plugin_call, expected_call)
+
+    def test_phase_order(self):
+        class First(Plugin):
+            writes = {"patched": ("build",)}
+
+            def patched(self, project_dir, spec, sack):
+                spec.build = Command("first")
+
+        class Second(Plugin):
+            after = ("Third",)
+            writes = {"patched": ("build",)}
+
+            def patched(self, project_dir, spec, sack):
+                spec.build = Command("second")
+
+        class Third(Plugin):
+            reads = {"patched": ("build",)}
+            writes = {"patched": ("install",)}
+
+            def patched(self, project_dir, spec, sack):
+                spec.install = Command(str(spec.build))
+
+        self.plugin_engine.plugins = set([Third(), Second(), First()])
+        order = self.plugin_engine._order_plugins(self.plugin_engine.plugins)
+        self.assertEqual(["First", "Third", "Second"],
+                         [_p.__class__.__name__ for _p in order])
+        deps = self.plugin_engine._phase_dependencies("patched", order)
+        self.assertEqual(deps[order[0]], set())
+        self.assertEqual(deps[order[1]], set([order[0]]))
+        self.assertEqual(deps[order[2]], set(order[:2]))
+        self.plugin_engine.execute_phase("patched", self.test_project_dir)
+        self.assertEqual("first", str(self.spec.install))
+        self.assertEqual("second", str(self.spec.build))
+
+    def test_profile(self):
+        class Install(Plugin):
+            writes = {"patched": ("install",)}
+
+            def patched(self, project_dir, spec, sack):
+                Command("true").execute()
+                # subprocess of helper thread is counted to the hook
+                with ThreadPoolExecutor(1) as executor:
+                    executor.submit(
+                        counted(Command("true").execute)).result()
+                spec.install = Command("make install")
+
+        self.plugin_engine.plugins = [Install()]
+        self.plugin_engine.execute_phase("patched", self.test_project_dir)
+        report = self.plugin_engine.profiler.report()
+        self.assertEqual(["patched"],
+                         [_p["phase"] for _p in report["phases"]])
+        record = report["hooks"][0]
+        self.assertEqual(("Install", "patched", 2, ["install"]),
+                         (record["plugin"], record["hook"],
+                          record["subprocesses"], record["changed"]))
+        self.assertGreaterEqual(record["children_cpu"], 0)
+        self.assertIn("Install", self.plugin_engine.profiler.summary())
@@ -1,11 +1,14 @@
 from tests.support import PluginTestCase
 from rpg.plugins.lang.python import PythonPlugin
-from rpg.plugins.misc.find_patch import FindPatchPlugin, _is_patch
+from rpg.content_type import content_types, PATCH
+from rpg.plugins.misc.find_patch import FindPatchPlugin
 from rpg.plugins.misc.find_file import FindFilePlugin
 from rpg.plugins.misc.find_translation import FindTranslationPlugin
 from rpg.plugins.misc.find_library import FindLibraryPlugin
 from rpg.plugins.misc.files_to_pkgs import FilesToPkgsPlugin
+from rpg.sack_index import CachedSack, SackIndex
 from rpg.plugins.lang.c import CPlugin
+from rpg.plugins.recover.bash_command import BashCommandPlugin
 from rpg.plugins.source_loader.tar import TarPlugin
 from rpg.plugins.source_loader.zip import ZipPlugin
 from rpg.spec import Spec
@@ -16,8 +19,14 @@ from rpg.plugins.project_builder.autotools import AutotoolsPlugin
 from rpg.plugins.project_builder.maven import MavenPlugin
 from pathlib import Path
 from shutil import rmtree
+import io
 import re
+import rpg.macros
+import stat
+import subprocess
+import tarfile
 import tempfile
+import zipfile
 
 
 class MockSack:
@@ -28,10 +37,11 @@ class MockSack:
 
 class MockedPackage:
 
-    def __init__(self, package):
+    def __init__(self, package, files=(), provides=(), license="GPLv2"):
         self.name = package
-
-    files = []
+        self.files = list(files)
+        self.provides = list(provides)
+        self.license = license
 
 
 class MockedLogging:
@@ -56,6 +66,16 @@ class MockedDNFQuery:
     def available(self):
         return self
 
+    def __iter__(self):
+        return iter([
+            MockedPackage("python3-dnf", [
+                "/usr/lib/python3.4/site-packages/dnf/conf/read.py"]),
+            MockedPackage("glibc-headers", [
+                "/usr/include/stdio.h", "/usr/include/sys/types.h"]),
+            MockedPackage("mingw32-headers", [
+                "/usr/i686-w64-mingw32/sys-root/mingw/include/stdio.h"]),
+        ])
+
 
 class FindPatchPluginTest(PluginTestCase):
 
@@ -68,8 +88,9 @@ class FindPatchPluginTest(PluginTestCase):
     def test_is_patch(self):
         patch = self.test_project_dir / "patch" / "0.patch"
         not_patch = self.test_project_dir / "c" / "sourcecode.c"
-        self.assertTrue(_is_patch(patch))
-        self.assertFalse(_is_patch(not_patch))
+        types = content_types([patch, not_patch])
+        self.assertEqual(types[patch], PATCH)
+        self.assertNotEqual(types[not_patch], PATCH)
 
     def test_find_patch(self):
         plugin = FindPatchPlugin()
@@ -114,6 +135,32 @@ class FindPatchPluginTest(PluginTestCase):
             r"/usr/lib.*/python.*/lib-dynload/math\.cpython.*\.so", req)
             for req in self.spec.required_files))
 
+    def test_python_compile(self):
+        site = "/usr/lib/python3.4/site-packages"
+        macros = {"%{python3_sitelib}": site, "%{python3_sitearch}": site}
+        install_dir = Path(tempfile.mkdtemp())
+        py_files = [install_dir / site[1:] / "pkg" / "mod.py",
+                    install_dir / "usr" / "bin" / "tool.py"]
+        for py_file in py_files:
+            py_file.parent.mkdir(parents=True)
+            with py_file.open("w") as source:
+                source.write("import os\n")
+        plugin = PythonPlugin()
+        rpg.macros.invalidate()
+        with mock.patch("rpg.macros.rpm.expandMacro",
+                        side_effect=lambda _m: macros.get(_m, "/none")), \
+                mock.patch("subprocess.Popen",
+                           wraps=subprocess.Popen) as popen:
+            plugin.installed(install_dir, self.spec, self.sack)
+        rpg.macros.invalidate()
+        rmtree(str(install_dir))
+        self.assertEqual(popen.call_count, 2)
+        compiled = [_f[0] for _f in self.spec.files if ".pyc" in _f[0]]
+        self.assertEqual(len(compiled), 4)
+        self.assertTrue(all(_f.startswith(("/usr/bin/__pycache__/tool.",
+                                           site + "/pkg/__pycache__/mod."))
+                            for _f in compiled))
+
     @mock.patch("logging.log", new=MockedLogging.log)
     def test_files_to_pkgs(self):
         ftpp = FilesToPkgsPlugin()
@@ -133,6 +180,62 @@ class FindPatchPluginTest(PluginTestCase):
         ftpp.installed(None, self.spec, MockSack())
         self.assertEqual({"python3-dnf"}, self.spec.BuildRequires)
 
+    def test_sack_index(self):
+        index = SackIndex()
+        index.add_packages(MockedDNFQuery())
+        self.assertEqual(
+            index.resolve(["/usr/include/stdio.h", "*sys/types.h",
+                           "*stdio.h", "/usr/include/s?dio.h", "*zlib.h",
+                           "/usr/include/zlib.h"]),
+            {"/usr/include/stdio.h": "glibc-headers",
+             "*sys/types.h": "glibc-headers",
+             "*stdio.h": "glibc-headers",
+             "/usr/include/s?dio.h": "glibc-headers"})
+        self.assertEqual(index._missing,
+                         set(["*zlib.h", "/usr/include/zlib.h"]))
+        sack = MockSack()
+        self.assertIs(SackIndex.get(sack), SackIndex.get(sack))
+
+    def test_sack_index_cache(self):
+        path = self.temp_dir / "sack.sqlite"
+        SackIndex(path).update_repo(
+            "fedora", "abc", [MockedPackage("python3", ["/usr/bin/python3"],
+                                            ["python(abi) = 3.4"])])
+        index = SackIndex(path)
+        index.update_repo("updates", "def", MockedDNFQuery())
+        fill = mock.Mock()
+        sack = CachedSack(SackIndex(path), fill)
+        index = SackIndex.get(sack)
+        self.assertEqual(index.repo_checksums(),
+                         {"fedora": "abc", "updates": "def"})
+        self.assertEqual(index.resolve(["*/python3"]),
+                         {"*/python3": "python3"})
+        self.assertEqual(index.provides(), ["python(abi) = 3.4"])
+        self.assertEqual(index.licenses(), ["GPLv2"])
+        self.assertIn("glibc-headers", index.names())
+        index.remove_repo("fedora")
+        self.assertEqual(index.resolve(["/usr/bin/python3"]), {})
+        self.assertFalse(fill.called)
+        sack.query()
+        self.assertTrue(fill.called)
+
+    def test_sack_index_complete(self):
+        index = SackIndex()
+        index.add_packages(
+            [MockedPackage("python3-dnf", provides=["python3-dnf = 1.1"]),
+             MockedPackage("python3", provides=["python(abi) = 3.4"]),
+             MockedPackage("python3-devel", license="MIT")])
+        self.assertEqual(index.complete("dependencies", "python3"),
+                         ["python3", "python3-dnf", "python3-devel",
+                          "python3-dnf = 1.1"])
+        self.assertEqual(index.complete("names", "python3-d", 1),
+                         ["python3-dnf"])
+        self.assertEqual(index.complete("provides", "x"), [])
+        self.assertEqual(index.licenses(), ["GPLv2", "MIT"])
+        index._RANK_RANGE = 1
+        self.assertEqual(index.complete("dependencies", "py", 3),
+                         ["python3", "python3-dnf", "python3-devel"])
+
     def test_c(self):
         c_plug = CPlugin()
         c_plug.patched(self.test_project_dir, self.spec, self.sack)
@@ -145,6 +248,31 @@ class FindPatchPluginTest(PluginTestCase):
         self.assertTrue([ele for ele in self.spec.build_required_files
                          if ele in expected])
 
+    def test_c_mock_recover(self):
+        c_plug = CPlugin()
+        log = ["a.c:1:18: fatal error: zlib.h: No such file or directory\n",
+               "b.c:2:20: fatal error: png.h: No such file or directory\n",
+               "c.c:1:18: fatal error: zlib.h: No such file or directory\n"]
+        self.assertTrue(c_plug.mock_recover(log, self.spec))
+        self.assertEqual(self.spec.build_required_files,
+                         set(["*zlib.h", "*png.h"]))
+        self.assertTrue(c_plug.mock_recover(
+            log[:1] + ["d.c:1:18: fatal error: sys/acl.h: No such file or "
+                       "directory\n"], self.spec))
+        self.assertIn("*sys/acl.h", self.spec.build_required_files)
+        self.assertFalse(c_plug.mock_recover([], self.spec))
+        self.assertRaises(RuntimeError, c_plug.mock_recover, log, self.spec)
+
+    def test_bash_mock_recover(self):
+        bash_plug = BashCommandPlugin()
+        log = ["/var/tmp/rpm-tmp.1: line 30: cmake: command not found\n",
+               "sh: /usr/sbin/ldconfig: Command not found\n"]
+        self.assertTrue(bash_plug.mock_recover(log, self.spec))
+        self.assertEqual(self.spec.build_required_files,
+                         set(["/usr/bin/cmake", "/usr/sbin/ldconfig"]))
+        self.assertRaises(RuntimeError, bash_plug.mock_recover,
+                          log, self.spec)
+
     def test_cmake(self):
         cmakeplug = CMakePlugin()
         cmakeplug.patched(self.test_project_dir / "c", self.spec, self.sack)
@@ -157,6 +285,27 @@ class FindPatchPluginTest(PluginTestCase):
         self.assertEqual(self.spec.build_required_files, expected)
         self.assertEqual(self.spec.required_files, expected)
 
+    def test_cmake_scan(self):
+        with (self.temp_dir / "CMakeLists.txt").open("w") as cmake:
+            cmake.write("cmake_minimum_required(VERSION 2.8) # project(no)\n"
+                        "#[[ find_package(Commented)\n]]\n"
+                        "project(Hello_World\n  VERSION 1.2.3 LANGUAGES C)\n"
+                        "find_package(ZLIB REQUIRED) #[[enable_testing()]]\n"
+                        "find_package\n(Qt5Core)\n")
+        index = SackIndex()
+        index.add_packages([MockedPackage("zlib-devel",
+                                          provides=["cmake(zlib) = 1.2"])])
+        cmakeplug = CMakePlugin()
+        cmakeplug.extracted(self.temp_dir, self.spec, self.sack)
+        self.assertEqual((self.spec.Name, self.spec.Version),
+                         ("HelloWorld", "1.2.3"))
+        with mock.patch("rpg.plugins.project_builder.cmake.SackIndex.get",
+                        return_value=index):
+            cmakeplug.patched(self.temp_dir, self.spec, MockSack())
+        self.assertEqual(self.spec.BuildRequires,
+                         set(["cmake", "cmake(zlib)"]))
+        self.assertEqual(str(self.spec.check), "")
+
     def test_setuptools(self):
         setuptplug = SetuptoolsPlugin()
         setuptplug.extracted(
@@ -221,14 +370,86 @@ class FindPatchPluginTest(PluginTestCase):
         temp_tar = self.test_project_dir / "archives" / "rpg-0.0.2-1.tar.gz"
         tar_plug.extraction(temp_tar, self.temp_dir)
         self.assertTrue(list(self.temp_dir.glob("**/*")))
-        self.assertTarEqualDir(temp_tar, self.temp_dir)
+        self.assertTarEqualDir(temp_tar, self.temp_dir, strip=1)
 
     def test_zip(self):
         zip_plugin = ZipPlugin()
         temp_tar = self.test_project_dir / "archives" / "rpg-0.0.2-1.zip"
         zip_plugin.extraction(temp_tar, self.temp_dir)
         self.assertTrue(list(self.temp_dir.glob("**/*")))
-        self.assertZipEqualDir(temp_tar, self.temp_dir)
+        self.assertZipEqualDir(temp_tar, self.temp_dir, strip=1)
+
+    def test_tar_multiple_top_dirs(self):
+        temp_tar = self.temp_dir / "multiple.tar.gz"
+        with tarfile.open(str(temp_tar), "w:gz") as tar:
+            tar.add(str(self.test_project_dir / "patch"), "patch")
+            tar.add(str(self.test_project_dir / "c"), "c")
+            tar.add(str(self.test_project_dir / "Makefile"), "Makefile")
+        extracted = self.temp_dir / "extracted"
+        extracted.mkdir()
+        TarPlugin().extraction(temp_tar, extracted)
+        self.assertTarEqualDir(temp_tar, extracted)
+
+    def test_tar_unsafe_and_readonly(self):
+        def add(name, type=tarfile.REGTYPE, mode=0o644, linkname="",
+                data=b""):
+            info = tarfile.TarInfo(name)
+            info.type, info.mode, info.linkname = type, mode, linkname
+            info.size = len(data)
+            info.mtime = 1000000000
+            tar.addfile(info, io.BytesIO(data))
+
+        temp_tar = self.temp_dir / "unsafe.tar"
+        with tarfile.open(str(temp_tar), "w") as tar:
+            add("p", tarfile.DIRTYPE, 0o755)
+            add("p/ro", tarfile.DIRTYPE, 0o555)
+            add("p/ro/file", data=b"content")
+            add("p/etc", tarfile.SYMTYPE, linkname="/etc")
+            add("p/etc/passwd", data=b"root")
+            add("p/up", tarfile.SYMTYPE, linkname="../../..")
+            add("p/up/x", data=b"x")
+        extracted = self.temp_dir / "extracted"
+        extracted.mkdir()
+        TarPlugin().extraction(temp_tar, extracted)
+        # symlinks pointing outside are skipped, members "inside" them
+        # are written into destination
+        self.assertEqual(["etc", "etc/passwd", "ro", "ro/file", "up",
+                          "up/x"],
+                         sorted(str(_p.relative_to(extracted))
+                                for _p in extracted.glob("**/*")))
+        self.assertFalse(any(_p.is_symlink()
+                             for _p in extracted.glob("**/*")))
+        self.assertEqual(0o555, (extracted / "ro").stat().st_mode & 0o777)
+        self.assertEqual(1000000000, (extracted / "ro").stat().st_mtime)
+        (extracted / "ro").chmod(0o755)
+
+    def test_zip_unsafe_links(self):
+        def add(name, data=b"", link=False):
+            info = zipfile.ZipInfo(name)
+            info.external_attr = ((stat.S_IFLNK | 0o777) if link else
+                                  (stat.S_IFREG | 0o644)) << 16
+            archive.writestr(info, data)
+
+        victim = self.temp_dir / "victim"
+        victim.mkdir()
+        temp_zip = self.temp_dir / "unsafe.zip"
+        with zipfile.ZipFile(str(temp_zip), "w") as archive:
+            add("p/file", b"content")
+            add("p/ok", b"file", link=True)
+            add("p/abs", str(victim).encode(), link=True)
+            add("p/abs/pwned", b"x")
+            add("p/up", b"../../victim", link=True)
+            add("p/up/pwned", b"x")
+        extracted = self.temp_dir / "extracted"
+        extracted.mkdir()
+        ZipPlugin().extraction(temp_zip, extracted)
+        self.assertEqual([], list(victim.iterdir()))
+        self.assertEqual(["abs", "abs/pwned", "file", "ok", "up",
+                          "up/pwned"],
+                         sorted(str(_p.relative_to(extracted))
+                                for _p in extracted.glob("**/*")))
+        self.assertEqual(["ok"], [_p.name for _p in extracted.iterdir()
+                                  if _p.is_symlink()])
 
     def tearDown(self):
         rmtree(str(self.temp_dir))
@@ -1,6 +1,7 @@
 from tests.support import RpgTestCase
 from rpg.spec import Spec
 from rpg.command import Command
+import json
 
 
 class SpecTest(RpgTestCase):
@@ -46,3 +47,22 @@ class SpecTest(RpgTestCase):
 
     def test_spec_getter_fail(self):
         self.assertRaises(AttributeError, getattr, self.spec, "bla")
+
+    def test_spec_dict(self):
+        self.spec.Name = "hello"
+        self.spec.BuildRequires.update(["gcc", "zlib-devel"])
+        self.spec.files = set([("/usr/bin/hello", "", ""),
+                               ("/usr/lib/libhello.so", "%attr(755, -, -)",
+                                "")])
+        self.spec.required_files.add("/usr/include/zlib.h")
+        self.spec.install = Command("make install")
+        self.spec.install.rpm_variables.append(("RPM_BUILD_ROOT", "/tmp"))
+        data = json.loads(json.dumps(self.spec.to_dict()))
+        spec = Spec.from_dict(data)
+        self.assertEqual(str(self.spec), str(spec))
+        self.assertEqual(self.spec.files, spec.files)
+        self.assertEqual(self.spec.required_files, spec.required_files)
+        self.assertEqual([("RPM_BUILD_ROOT", "/tmp")],
+                         spec.install.rpm_variables)
+        self.assertTrue(isinstance(spec.prep, Command))
+        self.assertEqual(data, spec.to_dict())
@@ -0,0 +1,70 @@
+from tests.support import RpgTestCase
+from rpg.workspace import Workspace, clone_tree
+from pathlib import Path
+from shutil import rmtree
+import tempfile
+
+
+class WorkspaceTest(RpgTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.workspace = Workspace(self.temp_dir / "rpg-abcdef0")
+        self.workspace.clear()
+
+    def test_clear(self):
+        self.assertExistInDir(Workspace.stages, self.workspace.path)
+        self.assertFalse(self.workspace.is_done("extracted", "abcdef0"))
+
+    def test_reuse(self):
+        self.workspace.done("extracted", "abcdef0")
+        self.workspace.done("compiled", "make")
+        reopened = Workspace(self.workspace.path)
+        self.assertTrue(reopened.is_done("extracted", "abcdef0"))
+        self.assertTrue(reopened.is_done("compiled", "make"))
+        self.assertFalse(reopened.is_done("compiled", "cmake . && make"))
+
+    def test_invalidate(self):
+        for stage in Workspace.stages:
+            self.workspace.done(stage)
+        self.workspace.invalidate("compiled")
+        self.assertTrue(self.workspace.is_done("extracted"))
+        self.assertFalse(self.workspace.is_done("compiled"))
+        self.assertFalse(self.workspace.is_done("installed"))
+
+    def test_missing_dir(self):
+        self.workspace.done("installed")
+        rmtree(str(self.workspace.stage_dir("installed")))
+        self.assertFalse(Workspace(self.workspace.path).is_done("installed"))
+
+    def test_checkpoint(self):
+        self.workspace.save_checkpoint("extracted", "abc", {"Name": "a"})
+        reopened = Workspace(self.workspace.path)
+        self.assertEqual({"Name": "a"},
+                         reopened.checkpoint("extracted", "abc"))
+        self.assertIsNone(reopened.checkpoint("extracted", "abd"))
+        self.assertIsNone(reopened.checkpoint("patched", "abc"))
+        reopened.clear()
+        self.assertIsNone(Workspace(self.workspace.path)
+                          .checkpoint("extracted", "abc"))
+
+    def test_clone_tree(self):
+        source = self.temp_dir / "source"
+        clone_tree(self.test_project_dir / "patch", source)
+        dest = self.temp_dir / "clone"
+        clone_tree(source, dest)
+        self.assertEqual(sorted(f.name for f in source.iterdir()),
+                         sorted(f.name for f in dest.iterdir()))
+        with (source / "0.patch").open("rb") as original, \
+                (dest / "0.patch").open("rb") as clone:
+            self.assertEqual(original.read(), clone.read())
+        self.assertNotEqual((source / "0.patch").stat().st_ino,
+                            (dest / "0.patch").stat().st_ino)
+        # written in place, clone keeps its content
+        with (source / "0.patch").open("r+b") as original:
+            original.write(b"edited")
+        with (dest / "0.patch").open("rb") as clone:
+            self.assertNotEqual(b"edited", clone.read(6))
+
+    def tearDown(self):
+        rmtree(str(self.temp_dir))